@@ -4,6 +4,6 @@ This package provides tools to compress natural language markdown files
 into caveman format to save input tokens.
 """
 
-__all__ = ["cli", "compress", "detect", "validate"]
+__all__ = ["backends", "batch", "cache", "cli", "compress", "daemon", "detect", "fileio", "index", "journal", "lexical", "repair", "retention", "scheduler", "secretscan", "sections", "sidecar", "tokenizer", "tracing", "validate"]
 
 __version__ = "1.0.0"
@@ -0,0 +1,683 @@
+#!/usr/bin/env python3
+"""Pluggable model backends behind ``call_claude``.
+
+Select with ``CAVEMAN_BACKEND`` or :func:`set_backend`:
+
+    auto                      Anthropic API if ANTHROPIC_API_KEY is set, else claude CLI (default)
+    anthropic                 Anthropic API only
+    cli                       ``claude --print`` only
+    record:<file.jsonl>       call ``auto`` and append prompt-hash -> response pairs
+    replay:<file.jsonl>       answer only from a recording (no network)
+    synthetic[:k=v,...]       offline stub: latency, jitter, error_rate, corrupt_rate, diverge_rate,
+                              seed, cache_ttl, prefill
+
+The record/replay and synthetic backends make the compress -> validate ->
+fix loop reproducible without network access, for profiling and load tests.
+
+Calls may carry ``system`` blocks: static instructions sent ahead of the
+prompt. The Anthropic backend marks each as a prompt-cache breakpoint and
+reports cache read/write tokens; the synthetic backend simulates that.
+
+Every backend can stream: given ``on_text``, output is passed to it chunk
+by chunk as it arrives. An exception raised from ``on_text`` stops the
+generation (closing the HTTP stream or killing the process) and
+propagates to the caller.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import shutil
+import subprocess
+import threading
+import time
+import weakref
+from pathlib import Path
+from typing import Callable, Dict, Optional, Sequence
+
+# Receives each chunk of streamed output.
+TextCallback = Callable[[str], None]
+
+DEFAULT_MODEL = "claude-sonnet-4-5"
+# Shortest prefix the provider caches (Sonnet/Opus); shorter ones are
+# processed uncached even when marked.
+CACHE_MIN_TOKENS = 1024
+MAX_TOKENS = 8192
+
+# Model-call transport settings
+API_TIMEOUT = float(os.environ.get("CAVEMAN_TIMEOUT", "300"))
+API_CONNECT_TIMEOUT = 10.0
+API_MAX_RETRIES = int(os.environ.get("CAVEMAN_API_RETRIES", "4"))
+POOL_SIZE = int(os.environ.get("CAVEMAN_POOL_SIZE", "16"))
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 30.0
+
+
+def current_model() -> str:
+    return os.environ.get("CAVEMAN_MODEL", DEFAULT_MODEL)
+
+
+def backoff_delay(attempt: int) -> float:
+    """Jittered exponential backoff for retry ``attempt`` (0-based)."""
+    return min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * (0.5 + random.random())
+
+
+class TransientError(RuntimeError):
+    """Retryable failure (rate limit, overload); ``retry_after`` in seconds if known."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class Completion:
+    """Model answer; ``input_tokens`` excludes prompt-cache reads and writes."""
+
+    def __init__(
+        self,
+        text: str,
+        input_tokens: Optional[int] = None,
+        output_tokens: Optional[int] = None,
+        cache_read_tokens: Optional[int] = None,
+        cache_write_tokens: Optional[int] = None,
+    ):
+        self.text = text
+        self.input_tokens = input_tokens
+        self.output_tokens = output_tokens
+        self.cache_read_tokens = cache_read_tokens
+        self.cache_write_tokens = cache_write_tokens
+
+    @property
+    def rate_limited_tokens(self) -> Optional[int]:
+        """Input tokens counted against rate limits: cache writes count, reads do not."""
+        if self.input_tokens is None:
+            return None
+        return self.input_tokens + (self.cache_write_tokens or 0)
+
+
+def full_prompt(prompt: str, system: Sequence[str] = ()) -> str:
+    """System blocks and prompt as one text, for backends without a system slot."""
+    return "\n\n".join([*system, prompt])
+
+
+class Backend:
+    name = "base"
+
+    def complete(
+        self, prompt: str, on_text: Optional[TextCallback] = None, system: Sequence[str] = ()
+    ) -> Completion:
+        raise NotImplementedError
+
+    async def acomplete(
+        self, prompt: str, on_text: Optional[TextCallback] = None, system: Sequence[str] = ()
+    ) -> Completion:
+        # Blocking backends run off the event loop by default.
+        return await asyncio.to_thread(self.complete, prompt, on_text, system)
+
+
+# ---------- Usage ----------
+
+
+class Usage:
+    """Token usage summed over every completed model call of the run."""
+
+    FIELDS = ("input_tokens", "output_tokens", "cache_read_tokens", "cache_write_tokens")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.totals: Dict[str, int] = dict.fromkeys(self.FIELDS, 0)
+
+    def record(self, completion: Completion):
+        with self._lock:
+            self.calls += 1
+            for field in self.FIELDS:
+                self.totals[field] += getattr(completion, field) or 0
+
+    def reset(self):
+        """Start the totals over, e.g. per daemon request."""
+        with self._lock:
+            self.calls = 0
+            self.totals = dict.fromkeys(self.FIELDS, 0)
+
+
+_usage = Usage()
+
+
+def get_usage() -> Usage:
+    return _usage
+
+
+def print_usage_report(usage: Optional[Usage] = None):
+    usage = usage or _usage
+    if not usage.calls:
+        return
+    t = usage.totals
+    prompt_tokens = t["input_tokens"] + t["cache_read_tokens"] + t["cache_write_tokens"]
+    cached = 100 * t["cache_read_tokens"] / prompt_tokens if prompt_tokens else 0.0
+    print(
+        f"Model usage: {usage.calls} calls, {t['input_tokens']} input + "
+        f"{t['cache_read_tokens']} cache read + {t['cache_write_tokens']} cache write tokens "
+        f"({cached:.0f}% of prompt tokens from cache), {t['output_tokens']} output tokens"
+    )
+
+
+# ---------- Anthropic API ----------
+
+
+def _retry_after(error) -> Optional[float]:
+    response = getattr(error, "response", None)
+    value = response.headers.get("retry-after") if response is not None else None
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _api_transient(error) -> bool:
+    """True for connection errors/timeouts, 429, 5xx and 529 overloaded."""
+    status = getattr(error, "status_code", None)
+    return status is None or status == 429 or status >= 500
+
+
+class AnthropicBackend(Backend):
+    """Anthropic Messages API through one pooled client per process.
+
+    The sync client lets the SDK retry 429/overloaded/5xx with exponential
+    backoff. The async clients (one per event loop) have SDK retries off
+    and raise :class:`TransientError` instead, so a rate-limit scheduler
+    can slow every in-flight job down, not just one.
+    """
+
+    name = "anthropic"
+
+    def __init__(self):
+        self._client = None
+        self._lock = threading.Lock()
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    @staticmethod
+    def available() -> bool:
+        if not os.environ.get("ANTHROPIC_API_KEY"):
+            return False
+        try:
+            import anthropic  # noqa: F401
+        except ImportError:
+            return False
+        return True
+
+    @staticmethod
+    def _client_options(max_retries: int, http_client_cls) -> dict:
+        import httpx
+
+        return dict(
+            api_key=os.environ["ANTHROPIC_API_KEY"],
+            timeout=httpx.Timeout(API_TIMEOUT, connect=API_CONNECT_TIMEOUT),
+            max_retries=max_retries,
+            http_client=http_client_cls(
+                limits=httpx.Limits(max_connections=POOL_SIZE, max_keepalive_connections=POOL_SIZE),
+            ),
+        )
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                import anthropic
+
+                self._client = anthropic.Anthropic(
+                    **self._client_options(API_MAX_RETRIES, anthropic.DefaultHttpxClient)
+                )
+            return self._client
+
+    def async_client(self):
+        import anthropic
+
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = anthropic.AsyncAnthropic(**self._client_options(0, anthropic.DefaultAsyncHttpxClient))
+            self._async_clients[loop] = client
+        return client
+
+    @staticmethod
+    def _completion(msg) -> Completion:
+        usage = msg.usage
+        return Completion(
+            msg.content[0].text,
+            usage.input_tokens,
+            usage.output_tokens,
+            getattr(usage, "cache_read_input_tokens", None) or 0,
+            getattr(usage, "cache_creation_input_tokens", None) or 0,
+        )
+
+    @staticmethod
+    def _request(prompt: str, system: Sequence[str]) -> dict:
+        request = dict(
+            model=current_model(),
+            max_tokens=MAX_TOKENS,
+            messages=[{"role": "user", "content": prompt}],
+        )
+        if system:
+            # Each block is a cache breakpoint: a later call sharing the
+            # same leading blocks reads them from the provider's cache.
+            request["system"] = [
+                {"type": "text", "text": block, "cache_control": {"type": "ephemeral"}}
+                for block in system
+            ]
+        return request
+
+    def complete(
+        self, prompt: str, on_text: Optional[TextCallback] = None, system: Sequence[str] = ()
+    ) -> Completion:
+        request = self._request(prompt, system)
+        if on_text is None:
+            return self._completion(self.client().messages.create(**request))
+        # Leaving the block early closes the response, cancelling generation
+        with self.client().messages.stream(**request) as stream:
+            for text in stream.text_stream:
+                on_text(text)
+            return self._completion(stream.get_final_message())
+
+    async def acomplete(
+        self, prompt: str, on_text: Optional[TextCallback] = None, system: Sequence[str] = ()
+    ) -> Completion:
+        import anthropic
+
+        request = self._request(prompt, system)
+        try:
+            if on_text is None:
+                msg = await self.async_client().messages.create(**request)
+            else:
+                async with self.async_client().messages.stream(**request) as stream:
+                    async for text in stream.text_stream:
+                        on_text(text)
+                    msg = await stream.get_final_message()
+        except (anthropic.APIConnectionError, anthropic.APIStatusError) as e:
+            if _api_transient(e):
+                raise TransientError(str(e), _retry_after(e)) from e
+            raise
+        return self._completion(msg)
+
+
+# ---------- claude CLI ----------
+
+
+# stderr of a ``claude`` run that failed for reasons worth retrying
+CLI_TRANSIENT_REGEX = re.compile(
+    r"rate.?limit|\b(?:429|500|502|503|504|529)\b|overloaded|timed? ?out|"
+    r"ECONNRESET|ECONNREFUSED|ETIMEDOUT|EAI_AGAIN|socket hang up|network|temporarily",
+    re.IGNORECASE,
+)
+
+
+def cli_transient(e: Exception) -> bool:
+    """True for CLI failures a retry can fix: timeouts, kills, rate limits, network.
+
+    Anything else (bad arguments, auth, a missing binary) fails the same way
+    on every attempt, so it is raised at once.
+    """
+    if isinstance(e, subprocess.TimeoutExpired):
+        return True
+    if not isinstance(e, subprocess.CalledProcessError):
+        return False
+    if e.returncode < 0:
+        return True  # killed by a signal
+    return bool(CLI_TRANSIENT_REGEX.search(f"{e.stderr or ''}\n{e.output or ''}"))
+
+
+class CLIBackend(Backend):
+    """``claude --print`` (handles desktop auth).
+
+    Each call is its own process: a long-lived ``claude`` session would
+    carry conversation history from one document into the next. System
+    blocks are sent inline ahead of the prompt, as before; the CLI gives
+    no control over prompt caching.
+    """
+
+    name = "cli"
+
+    def __init__(self):
+        self.binary = shutil.which("claude") or "claude"
+
+    def _run(self, prompt: str) -> str:
+        result = subprocess.run(
+            [self.binary, "--print"],
+            input=prompt,
+            text=True,
+            capture_output=True,
+            check=True,
+            timeout=API_TIMEOUT,
+        )
+        return result.stdout
+
+    def _stream(self, prompt: str, on_text: TextCallback) -> str:
+        """Run ``claude --print`` passing stdout to ``on_text`` line by line."""
+        proc = subprocess.Popen(
+            [self.binary, "--print"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        timer = threading.Timer(API_TIMEOUT, proc.kill)
+        timer.start()
+        chunks = []
+        try:
+            proc.stdin.write(prompt)
+            proc.stdin.close()
+            for line in proc.stdout:
+                chunks.append(line)
+                on_text(line)
+            stderr = proc.stderr.read()
+            proc.wait()
+        except BaseException:
+            proc.kill()
+            proc.wait()
+            raise
+        finally:
+            timer.cancel()
+            proc.stdout.close()
+            proc.stderr.close()
+        output = "".join(chunks)
+        if proc.returncode:
+            if chunks:
+                # on_text has seen part of an answer: let the caller restart cleanly
+                raise TransientError(f"claude exited with {proc.returncode} mid-answer")
+            if proc.returncode < 0:
+                raise subprocess.TimeoutExpired(proc.args, API_TIMEOUT)
+            raise subprocess.CalledProcessError(proc.returncode, proc.args, output, stderr)
+        return output
+
+    def complete(
+        self, prompt: str, on_text: Optional[TextCallback] = None, system: Sequence[str] = ()
+    ) -> Completion:
+        prompt = full_prompt(prompt, system)
+        for attempt in range(API_MAX_RETRIES + 1):
+            try:
+                return Completion(self._stream(prompt, on_text) if on_text else self._run(prompt))
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired) as e:
+                detail = e.stderr if isinstance(e, subprocess.CalledProcessError) else f"timed out after {API_TIMEOUT:.0f}s"
+                if attempt == API_MAX_RETRIES or not cli_transient(e):
+                    raise RuntimeError(f"Claude call failed:\n{detail}")
+                time.sleep(backoff_delay(attempt))
+        raise AssertionError("unreachable")
+
+
+def auto_backend() -> Backend:
+    return AnthropicBackend() if AnthropicBackend.available() else CLIBackend()
+
+
+# ---------- Record / Replay ----------
+
+
+def prompt_hash(prompt: str) -> str:
+    return hashlib.sha256(prompt.encode("utf-8", errors="surrogatepass")).hexdigest()
+
+
+class ReplayBackend(Backend):
+    """Serve responses from a JSONL file of ``{"prompt_sha256", "response"}`` pairs.
+
+    With ``inner`` set (record mode) misses are forwarded to it and the
+    new pair is appended to the file; without it a miss is an error.
+    """
+
+    def __init__(self, path: Path, inner: Optional[Backend] = None):
+        self.path = Path(path)
+        self.inner = inner
+        self.name = "record" if inner else "replay"
+        self._lock = threading.Lock()
+        self._responses = {}
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    if line.strip():
+                        entry = json.loads(line)
+                        self._responses[entry["prompt_sha256"]] = entry["response"]
+
+    def _lookup(self, key: str) -> Optional[Completion]:
+        text = self._responses.get(key)
+        return Completion(text) if text is not None else None
+
+    def _miss(self, key: str):
+        raise RuntimeError(f"No recorded response for prompt {key[:12]} in {self.path}")
+
+    def _record(self, key: str, completion: Completion):
+        with self._lock:
+            self._responses[key] = completion.text
+            with open(self.path, "a") as f:
+                f.write(json.dumps({"prompt_sha256": key, "response": completion.text}) + "\n")
+
+    def complete(
+        self, prompt: str, on_text: Optional[TextCallback] = None, system: Sequence[str] = ()
+    ) -> Completion:
+        key = prompt_hash(full_prompt(prompt, system))
+        hit = self._lookup(key)
+        if hit is not None:
+            if on_text:
+                on_text(hit.text)
+            return hit
+        if self.inner is None:
+            self._miss(key)
+        completion = self.inner.complete(prompt, on_text, system)
+        self._record(key, completion)
+        return completion
+
+    async def acomplete(
+        self, prompt: str, on_text: Optional[TextCallback] = None, system: Sequence[str] = ()
+    ) -> Completion:
+        key = prompt_hash(full_prompt(prompt, system))
+        hit = self._lookup(key)
+        if hit is not None:
+            if on_text:
+                on_text(hit.text)
+            return hit
+        if self.inner is None:
+            self._miss(key)
+        completion = await self.inner.acomplete(prompt, on_text, system)
+        self._record(key, completion)
+        return completion
+
+
+# ---------- Synthetic ----------
+
+# Where the document sits inside the prompts built by compress.py.
+COMPRESS_MARKER = "TEXT:\n"
+FIX_ORIGINAL_MARKER = "ORIGINAL (reference only):\n"
+FIX_COMPRESSED_MARKER = "\n\nCOMPRESSED (fix this):\n"
+
+URL_IN_TEXT_REGEX = re.compile(r"https?://[^\s)]+")
+HEADING_LINE_REGEX = re.compile(r"^#{1,6}\s.*\n?", re.MULTILINE)
+
+
+def extract_document(prompt: str) -> str:
+    """The markdown a compress or fix prompt asks about (the original, for fixes)."""
+    if FIX_ORIGINAL_MARKER in prompt:
+        return prompt.split(FIX_ORIGINAL_MARKER, 1)[1].split(FIX_COMPRESSED_MARKER, 1)[0]
+    if COMPRESS_MARKER in prompt:
+        return prompt.rsplit(COMPRESS_MARKER, 1)[1]
+    return prompt
+
+
+def lexical_responder(prompt: str) -> str:
+    from .lexical import compress_text
+
+    return compress_text(extract_document(prompt).strip("\n"))
+
+
+class SyntheticBackend(Backend):
+    """Offline stub with configurable latency and failure injection.
+
+    ``latency`` +- ``jitter`` seconds per call; ``error_rate`` of calls raise
+    :class:`TransientError`; ``corrupt_rate`` of responses lose a URL so the
+    validate -> fix path gets exercised, and ``diverge_rate`` lose their
+    first heading so streaming checks have something to stop. Responses
+    default to the local lexical compression of the prompt's document and
+    stream line by line, the latency spread over the lines. Deterministic
+    per ``seed``.
+
+    System blocks go through a simulated prompt cache: a block whose
+    prefix was sent within ``cache_ttl`` seconds counts as a cache read,
+    otherwise as a cache write; prefixes under CACHE_MIN_TOKENS are not
+    cached and count as plain input, as with the API. ``prefill`` adds seconds per 1000 tokens
+    not read from cache, so cache hits also show up as lower latency.
+    """
+
+    name = "synthetic"
+
+    def __init__(
+        self,
+        latency: float = 0.5,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        corrupt_rate: float = 0.0,
+        diverge_rate: float = 0.0,
+        retry_after: Optional[float] = None,
+        seed: Optional[int] = 0,
+        cache_ttl: float = 300.0,
+        prefill: float = 0.0,
+        responder: Callable[[str], str] = lexical_responder,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.corrupt_rate = corrupt_rate
+        self.diverge_rate = diverge_rate
+        self.retry_after = retry_after
+        self.cache_ttl = cache_ttl
+        self.prefill = prefill
+        self.responder = responder
+        self.calls = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._prefixes: Dict[str, float] = {}  # prefix hash -> expiry
+
+    @staticmethod
+    def _tokens(text: str) -> int:
+        return max(1, len(text) // 4)
+
+    def _cache(self, system: Sequence[str]):
+        """``(read, write, uncached)`` tokens of ``system`` against the simulated cache."""
+        read = write = 0
+        pending = total = 0  # tokens since the last cached breakpoint
+        prefix = hashlib.sha256()
+        now = time.monotonic()
+        for block in system:
+            prefix.update(block.encode("utf-8", errors="surrogatepass"))
+            pending += self._tokens(block)
+            total += self._tokens(block)
+            if total < CACHE_MIN_TOKENS:
+                continue
+            key = prefix.hexdigest()
+            if self._prefixes.get(key, 0.0) > now:
+                read += pending
+            else:
+                write += pending
+            self._prefixes[key] = now + self.cache_ttl
+            pending = 0
+        return read, write, pending
+
+    def _plan(self, prompt: str, system: Sequence[str]):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.error_rate
+            corrupt = self._rng.random() < self.corrupt_rate
+            diverge = self._rng.random() < self.diverge_rate
+            cached = self._cache(system) if not fail else (0, 0, 0)
+        delay += self.prefill * (self._tokens(prompt) + cached[1] + cached[2]) / 1000
+        return delay, (fail, corrupt, diverge, cached)
+
+    def _respond(self, prompt: str, plan) -> Completion:
+        fail, corrupt, diverge, (read, write, uncached) = plan
+        if fail:
+            raise TransientError("synthetic rate limit", self.retry_after)
+        text = self.responder(prompt)
+        if FIX_ORIGINAL_MARKER not in prompt:
+            if corrupt:
+                text = URL_IN_TEXT_REGEX.sub("", text, count=1)
+            if diverge:
+                text = HEADING_LINE_REGEX.sub("", text, count=1)
+        return Completion(text, self._tokens(prompt) + uncached, self._tokens(text), read, write)
+
+    @staticmethod
+    def _chunks(text: str, delay: float):
+        """``(chunk, seconds before it)`` per line, spreading ``delay`` by length."""
+        lines = text.splitlines(keepends=True) or [text]
+        for line in lines:
+            yield line, delay * len(line) / max(1, len(text))
+
+    def complete(
+        self, prompt: str, on_text: Optional[TextCallback] = None, system: Sequence[str] = ()
+    ) -> Completion:
+        delay, plan = self._plan(prompt, system)
+        if on_text is None:
+            time.sleep(delay)
+            return self._respond(prompt, plan)
+        completion = self._respond(prompt, plan)
+        for chunk, wait in self._chunks(completion.text, delay):
+            time.sleep(wait)
+            on_text(chunk)
+        return completion
+
+    async def acomplete(
+        self, prompt: str, on_text: Optional[TextCallback] = None, system: Sequence[str] = ()
+    ) -> Completion:
+        delay, plan = self._plan(prompt, system)
+        if on_text is None:
+            await asyncio.sleep(delay)
+            return self._respond(prompt, plan)
+        completion = self._respond(prompt, plan)
+        for chunk, wait in self._chunks(completion.text, delay):
+            await asyncio.sleep(wait)
+            on_text(chunk)
+        return completion
+
+
+# ---------- Selection ----------
+
+_backend: Optional[Backend] = None
+_backend_lock = threading.Lock()
+
+
+def _parse_options(spec: str) -> dict:
+    options = {}
+    for item in filter(None, spec.split(",")):
+        key, _, value = item.partition("=")
+        options[key.strip()] = float(value) if key.strip() != "seed" else int(value)
+    return options
+
+
+def backend_from_spec(spec: str) -> Backend:
+    kind, _, arg = spec.partition(":")
+    if kind == "auto":
+        return auto_backend()
+    if kind == "anthropic":
+        return AnthropicBackend()
+    if kind == "cli":
+        return CLIBackend()
+    if kind == "record":
+        return ReplayBackend(Path(arg), inner=auto_backend())
+    if kind == "replay":
+        return ReplayBackend(Path(arg))
+    if kind == "synthetic":
+        return SyntheticBackend(**_parse_options(arg))
+    raise ValueError(f"Unknown CAVEMAN_BACKEND: {spec!r}")
+
+
+def get_backend() -> Backend:
+    """The process-wide backend, built from ``CAVEMAN_BACKEND`` on first use."""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = backend_from_spec(os.environ.get("CAVEMAN_BACKEND", "auto"))
+        return _backend
+
+
+def set_backend(backend: Optional[Backend]):
+    """Install ``backend`` for all later calls (None: rebuild from the env)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""Batch compression: expand directories/globs and compress through a worker pool."""
+
+import asyncio
+import glob
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from .compress import can_update, compress_file, compress_file_async, compress_mode, index_status, is_sensitive_path
+from .detect import SKIP_EXTENSIONS, FileProbe, should_compress
+from .index import CURRENT
+from .journal import recover
+from .scheduler import RateLimitScheduler
+from .secretscan import describe as describe_secrets, scan_enabled, scan_paths
+from .tokenizer import count_tokens
+from .tracing import span
+
+DEFAULT_JOBS = int(os.environ.get("CAVEMAN_JOBS", "4"))
+
+# Directories never worth descending into when a directory target is given.
+SKIP_DIRS = frozenset({
+    ".git", ".hg", ".svn", "node_modules", ".venv", "venv",
+    "__pycache__", ".next", "dist", "build", ".caveman",
+})
+
+GLOB_CHARS = frozenset("*?[")
+
+
+class BatchResult:
+    def __init__(self, path: Path, status: str, detail: str = "", elapsed: float = 0.0):
+        self.path = path
+        self.status = status  # compressed | failed | skipped | refused | error
+        self.detail = detail
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.status in ("compressed", "skipped", "refused")
+
+
+# ---------- Target Expansion ----------
+
+
+def _walk(directory: Path) -> Iterable[Path]:
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d not in SKIP_DIRS)
+        for name in sorted(files):
+            yield Path(root) / name
+
+
+def _is_candidate(path: Path) -> bool:
+    """Cheap name-only filter applied to files found by directory/glob expansion."""
+    if path.name.endswith(".original.md"):
+        return False
+    return path.suffix.lower() not in SKIP_EXTENSIONS
+
+
+def collect_files(targets: Iterable[str]) -> List[Path]:
+    """Expand file, directory and glob targets into a de-duplicated file list.
+
+    Files named explicitly are always kept so they show up in the status
+    table; files discovered through a directory or glob are pre-filtered by
+    name so code and backups do not flood the report.
+    """
+    seen = set()
+    files = []
+
+    def add(path: Path):
+        path = path.resolve()
+        if path not in seen:
+            seen.add(path)
+            files.append(path)
+
+    for target in targets:
+        path = Path(target).expanduser()
+        if path.is_dir():
+            for found in _walk(path):
+                if _is_candidate(found):
+                    add(found)
+        elif path.is_file():
+            add(path)
+        elif GLOB_CHARS & set(target):
+            for match in sorted(glob.glob(str(path), recursive=True)):
+                found = Path(match)
+                if found.is_file() and _is_candidate(found):
+                    add(found)
+        else:
+            # Keep unknown targets so the table reports them as errors.
+            add(path)
+    return files
+
+
+# ---------- Planning ----------
+
+
+def _detect(path: Path, probe: FileProbe) -> bool:
+    with span("detect"):
+        return should_compress(path, probe)
+
+
+def plan(files: Iterable[Path], mode: str = "model", budget: Optional[int] = None):
+    """Split files into compressible jobs and pre-decided results.
+
+    Runs the cheap local checks (existence, sensitive names, file type,
+    existing backups, the repo index, a token ``budget``) up front so the
+    worker pool only sees files that will actually hit the API. Files the
+    index reports as current under ``mode`` are skipped on size/mtime
+    alone. Jobs are the :class:`FileProbe` used for detection, so workers
+    reuse its read.
+    """
+    jobs = []
+    decided = []
+    for path in files:
+        probe = FileProbe(path)
+        if not path.exists():
+            decided.append(BatchResult(path, "error", "file not found"))
+        elif not path.is_file():
+            decided.append(BatchResult(path, "error", "not a file"))
+        elif is_sensitive_path(path):
+            decided.append(BatchResult(path, "refused", "filename looks sensitive"))
+        elif not _detect(path, probe):
+            decided.append(BatchResult(path, "skipped", "not natural language"))
+        elif path.with_name(path.stem + ".original.md").exists():
+            if index_status(path, mode, budget) == CURRENT:
+                decided.append(BatchResult(path, "skipped", "up to date"))
+            elif can_update(path):
+                jobs.append(probe)
+            else:
+                decided.append(BatchResult(path, "skipped", "backup already exists"))
+        elif budget is not None and count_tokens(probe.text()) <= budget:
+            decided.append(BatchResult(path, "skipped", "within budget"))
+        else:
+            jobs.append(probe)
+    return jobs, decided
+
+
+def screen_secrets(jobs: List[FileProbe]):
+    """Split jobs into those safe to send and "refused" results for ones holding secrets.
+
+    Scans the text each job would send (its backup when updating), across
+    processes for large batches; verdicts are memoized by content hash so
+    the per-file check in the pipeline does not scan again.
+    """
+    sources = {}
+    for probe in jobs:
+        backup = probe.path.with_name(probe.path.stem + ".original.md")
+        sources[probe.path] = backup if backup.exists() else probe.path
+    findings = scan_paths(sources.values())
+    safe, refused = [], []
+    for probe in jobs:
+        found = findings.get(sources[probe.path])
+        if found:
+            refused.append(BatchResult(probe.path, "refused", f"content looks like secrets: {describe_secrets(found)}"))
+        else:
+            safe.append(probe)
+    return safe, refused
+
+
+# ---------- Execution ----------
+
+
+def _result(path: Path, success: bool, start: float) -> BatchResult:
+    elapsed = time.perf_counter() - start
+    if success:
+        return BatchResult(path, "compressed", "", elapsed)
+    return BatchResult(path, "failed", "validation failed after retries", elapsed)
+
+
+def _run_one(probe: FileProbe, **options) -> BatchResult:
+    path = probe.path
+    probe.refresh()  # the file may have changed while the job was queued
+    start = time.perf_counter()
+    try:
+        success = compress_file(path, probe=probe, **options)
+    except Exception as e:
+        return BatchResult(path, "error", str(e), time.perf_counter() - start)
+    return _result(path, success, start)
+
+
+async def _run_one_async(probe: FileProbe, limit: asyncio.Semaphore, scheduler, **options) -> BatchResult:
+    path = probe.path
+    async with limit:
+        probe.refresh()
+        start = time.perf_counter()
+        try:
+            success = await compress_file_async(path, scheduler=scheduler, probe=probe, **options)
+        except Exception as e:
+            return BatchResult(path, "error", str(e), time.perf_counter() - start)
+        return _result(path, success, start)
+
+
+async def _run_all_async(probes: List[FileProbe], jobs: int, **options) -> List[BatchResult]:
+    limit = asyncio.Semaphore(max(1, jobs))
+    scheduler = RateLimitScheduler()
+    results = await asyncio.gather(*(_run_one_async(p, limit, scheduler, **options) for p in probes))
+    if scheduler.rate_limited:
+        print(f"Rate limited {scheduler.rate_limited} time(s); scheduler slowed to {100 * scheduler.scale:.0f}%")
+    return list(results)
+
+
+def run_batch(
+    targets: Iterable[str],
+    jobs: int = DEFAULT_JOBS,
+    use_async: bool = False,
+    **options,
+) -> List[BatchResult]:
+    """Compress every eligible file under ``targets`` with ``jobs`` concurrent workers.
+
+    With ``use_async`` the files run on one event loop and model calls are
+    paced by a shared :class:`RateLimitScheduler` (``CAVEMAN_RPM`` /
+    ``CAVEMAN_TPM``) instead of a thread pool. Extra keyword ``options``
+    are passed through to :func:`compress_file`.
+    """
+    files = collect_files(targets)
+    # Resume after an interrupted batch: finish swaps whose output landed,
+    # drop backups of ones that did not, before deciding what to run
+    for path, outcome in recover(files):
+        print(f"Recovered interrupted run: {path}: {outcome}")
+    mode = compress_mode(options.get("local", False), options.get("precompress", False))
+    with span("plan", files=len(files)):
+        todo, results = plan(files, mode, options.get("budget"))
+    if todo and mode != "local" and scan_enabled():
+        with span("secrets", files=len(todo)):
+            todo, refused = screen_secrets(todo)
+        results.extend(refused)
+
+    if todo and use_async:
+        results.extend(asyncio.run(_run_all_async(todo, jobs, **options)))
+    elif todo:
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as pool:
+            futures = [pool.submit(_run_one, probe, **options) for probe in todo]
+            for future in as_completed(futures):
+                results.append(future.result())
+
+    order = {path: i for i, path in enumerate(files)}
+    results.sort(key=lambda r: order.get(r.path, len(order)))
+    return results
+
+
+# ---------- Reporting ----------
+
+STATUS_ICONS = {
+    "compressed": "✅",
+    "failed": "❌",
+    "error": "❌",
+    "skipped": "⏭️",
+    "refused": "🔒",
+}
+
+
+def _display_path(path: Path) -> str:
+    try:
+        return str(path.relative_to(Path.cwd()))
+    except ValueError:
+        return str(path)
+
+
+def print_status_table(results: List[BatchResult]):
+    print("\n| File | Status | Time | Detail |")
+    print("|------|--------|------|--------|")
+    for r in results:
+        icon = STATUS_ICONS.get(r.status, "")
+        elapsed = f"{r.elapsed:.1f}s" if r.elapsed else "-"
+        print(f"| {_display_path(r.path)} | {icon} {r.status} | {elapsed} | {r.detail} |")
+
+    counts = {}
+    for r in results:
+        counts[r.status] = counts.get(r.status, 0) + 1
+    summary = ", ".join(f"{n} {status}" for status, n in sorted(counts.items()))
+    print(f"\n{len(results)} files: {summary}")
@@ -1,37 +1,232 @@
 #!/usr/bin/env python3
-from pathlib import Path
+"""
+Caveman compression benchmark
+
+Usage:
+    python3 -m scripts.benchmark [original.md compressed.md]
+        [--dir DIR] [--jobs N] [--json out.json] [--model]
+    python3 -m scripts.benchmark --imports
+
+Runs file pairs in a process pool and records wall time per stage
+(detect, tokenize, validate and, with --model, a live compress call).
+Reports token savings per file plus throughput and stage percentiles, as
+a markdown table and optionally as JSON for regression tracking.
+
+--imports checks CLI start-up instead: a run that ends in a skip decision
+must import nothing from this package beyond detect, and no heavy
+third-party modules.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
 import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 
 # Support both direct execution and module import
 try:
+    from . import __version__
+    from . import tokenizer
+    from .detect import detect_file_type
+    from .tokenizer import count_tokens, count_tokens_batch
     from .validate import validate
 except ImportError:
     sys.path.insert(0, str(Path(__file__).parent))
+    import tokenizer
+    from detect import detect_file_type
+    from tokenizer import count_tokens, count_tokens_batch
     from validate import validate
+    __version__ = "unknown"
 
-try:
-    import tiktoken
-    _enc = tiktoken.get_encoding("o200k_base")
-except ImportError:
-    _enc = None
+STAGES = ("detect", "tokenize", "validate", "model")
+PERCENTILES = (50, 90, 99)
 
 
-def count_tokens(text):
-    if _enc is None:
-        return len(text.split())  # fallback: word count
-    return len(_enc.encode(text))
+def _model_compress(text: str) -> str:
+    try:
+        from .compress import build_compress_prompt, call_claude, compress_system
+    except ImportError:
+        raise SystemExit("--model needs module mode: python3 -m scripts.benchmark --model")
+    return call_claude(build_compress_prompt(text), system=compress_system())
 
 
-def benchmark_pair(orig_path: Path, comp_path: Path):
+def benchmark_pair_timed(orig_path: Path, comp_path: Path, model: bool = False) -> dict:
+    """Benchmark one pair, timing each stage separately (seconds)."""
+    timings = {}
+    start = time.perf_counter()
+
+    t = time.perf_counter()
+    detect_file_type(orig_path)
+    timings["detect"] = time.perf_counter() - t
+
     orig_text = orig_path.read_text()
     comp_text = comp_path.read_text()
 
-    orig_tokens = count_tokens(orig_text)
-    comp_tokens = count_tokens(comp_text)
-    saved = 100 * (orig_tokens - comp_tokens) / orig_tokens if orig_tokens > 0 else 0.0
+    t = time.perf_counter()
+    orig_tokens, comp_tokens = count_tokens_batch([orig_text, comp_text])
+    timings["tokenize"] = time.perf_counter() - t
+
+    t = time.perf_counter()
     result = validate(orig_path, comp_path)
+    timings["validate"] = time.perf_counter() - t
+
+    row = {
+        "file": comp_path.name,
+        "original_tokens": orig_tokens,
+        "compressed_tokens": comp_tokens,
+        "saved_pct": 100 * (orig_tokens - comp_tokens) / orig_tokens if orig_tokens > 0 else 0.0,
+        "valid": result.is_valid,
+        "errors": result.errors,
+        "bytes": len(orig_text.encode()) + len(comp_text.encode()),
+    }
+
+    if model:
+        t = time.perf_counter()
+        model_text = _model_compress(orig_text)
+        timings["model"] = time.perf_counter() - t
+        row["model_tokens"] = count_tokens(model_text)
+
+    row["timings"] = timings
+    row["total"] = time.perf_counter() - start
+    return row
+
+
+def _run_pair(args):
+    return benchmark_pair_timed(*args)
+
+
+def run_benchmark(pairs, jobs: int = os.cpu_count() or 1, model: bool = False) -> dict:
+    """Benchmark ``pairs`` of (original, compressed) paths in a process pool."""
+    start = time.perf_counter()
+    work = [(orig, comp, model) for orig, comp in pairs]
+    if jobs <= 1 or len(work) <= 1:
+        rows = [_run_pair(w) for w in work]
+    else:
+        with ProcessPoolExecutor(max_workers=min(jobs, len(work))) as pool:
+            rows = list(pool.map(_run_pair, work))
+    wall = time.perf_counter() - start
+    return summarize(rows, wall, jobs)
+
+
+# ---------- Metrics ----------
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile; 0.0 for an empty list."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, -(-pct * len(ordered) // 100))
+    return ordered[min(len(ordered), int(rank)) - 1]
+
+
+def summarize(rows, wall: float, jobs: int) -> dict:
+    orig_total = sum(r["original_tokens"] for r in rows)
+    comp_total = sum(r["compressed_tokens"] for r in rows)
+    stages = {}
+    for stage in STAGES:
+        values = [r["timings"][stage] for r in rows if stage in r["timings"]]
+        if values:
+            stages[stage] = {
+                "total": sum(values),
+                "mean": sum(values) / len(values),
+                **{f"p{p}": percentile(values, p) for p in PERCENTILES},
+                "max": max(values),
+            }
+    per_file = [r["total"] for r in rows]
+    return {
+        "version": __version__,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "tokenizer": tokenizer.name(),
+        "jobs": jobs,
+        "files": len(rows),
+        "wall_seconds": wall,
+        "files_per_second": len(rows) / wall if wall > 0 else 0.0,
+        "tokens_per_second": (orig_total + comp_total) / wall if wall > 0 else 0.0,
+        "original_tokens": orig_total,
+        "compressed_tokens": comp_total,
+        "saved_pct": 100 * (orig_total - comp_total) / orig_total if orig_total else 0.0,
+        "valid": sum(1 for r in rows if r["valid"]),
+        "file_seconds": {f"p{p}": percentile(per_file, p) for p in PERCENTILES},
+        "stages": stages,
+        "rows": rows,
+    }
+
+
+# ---------- Import Time ----------
+
+PACKAGE = __package__ or "scripts"
+SKIP_PATH_MODULES = frozenset({PACKAGE, f"{PACKAGE}.__main__", f"{PACKAGE}.cli", f"{PACKAGE}.detect"})
+HEAVY_MODULES = frozenset({"anthropic", "tiktoken", "numpy", "httpx"})
+IMPORT_RUNS = 5
+
+
+def _importtime(args, cwd: Path):
+    """Run ``python -X importtime`` with ``args``; returns (wall s, {module: self us})."""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", *args],
+        cwd=cwd, capture_output=True, text=True,
+    )
+    wall = time.perf_counter() - start
+    modules = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|", 2)
+        if self_us.strip().isdigit():
+            modules[name.strip()] = int(self_us)
+    return wall, modules
 
-    return (comp_path.name, orig_tokens, comp_tokens, saved, result.is_valid)
+
+def benchmark_imports(runs: int = IMPORT_RUNS) -> dict:
+    """Time a CLI run that ends at the skip decision, and a full compress import."""
+    root = Path(__file__).resolve().parent.parent
+    report = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        skipped = Path(tmp) / "hook.py"
+        skipped.write_text("import os\n\ndef main():\n    return os.getcwd()\n")
+        cases = {
+            "skip": ["-m", PACKAGE, str(skipped)],
+            "compress": ["-c", f"import {PACKAGE}.compress"],
+        }
+        for case, args in cases.items():
+            walls, modules = [], {}
+            for _ in range(runs):
+                wall, modules = _importtime(args, root)
+                walls.append(wall)
+            own = sorted(m for m in modules if m == PACKAGE or m.startswith(PACKAGE + "."))
+            report[case] = {
+                "wall_ms": 1000 * statistics.median(walls),
+                "import_ms": sum(modules.values()) / 1000,
+                "modules": len(modules),
+                "package_modules": own,
+                "heavy_modules": sorted(m for m in modules if m.split(".")[0] in HEAVY_MODULES),
+            }
+    return report
+
+
+def import_violations(report: dict) -> list:
+    skip = report["skip"]
+    problems = [f"skip path imports {m}" for m in skip["package_modules"] if m not in SKIP_PATH_MODULES]
+    problems += [f"skip path imports {m}" for m in skip["heavy_modules"]]
+    problems += [f"compress import loads {m} eagerly" for m in report["compress"]["heavy_modules"]]
+    return problems
+
+
+def print_import_report(report: dict):
+    print("\n| Case | Wall ms | Import ms | Modules | Package modules |")
+    print("|------|---------|-----------|---------|-----------------|")
+    for case, r in report.items():
+        own = ", ".join(m.removeprefix(PACKAGE + ".") for m in r["package_modules"])
+        print(f"| {case} | {r['wall_ms']:.1f} | {r['import_ms']:.1f} | {r['modules']} | {own} |")
+
+
+# ---------- Output ----------
 
 
 def print_table(rows):
@@ -41,37 +236,88 @@ def print_table(rows):
         print(f"| {r[0]} | {r[1]} | {r[2]} | {r[3]:.1f}% | {'✅' if r[4] else '❌'} |")
 
 
+def print_report(report: dict):
+    print_table([
+        (r["file"], r["original_tokens"], r["compressed_tokens"], r["saved_pct"], r["valid"])
+        for r in report["rows"]
+    ])
+
+    print(f"\n| Stage | Total ms | Mean ms | {' | '.join(f'p{p} ms' for p in PERCENTILES)} | Max ms |")
+    print(f"|-------|----------|---------|{'|'.join('------' for _ in PERCENTILES)}|--------|")
+    for stage, s in report["stages"].items():
+        cells = " | ".join(f"{1000 * s[f'p{p}']:.2f}" for p in PERCENTILES)
+        print(f"| {stage} | {1000 * s['total']:.2f} | {1000 * s['mean']:.2f} | {cells} | {1000 * s['max']:.2f} |")
+
+    print(
+        f"\n{report['files']} files in {report['wall_seconds']:.3f}s ({report['jobs']} jobs): "
+        f"{report['files_per_second']:.1f} files/s, {report['tokens_per_second']:.0f} tokens/s, "
+        f"{report['saved_pct']:.1f}% saved, {report['valid']}/{report['files']} valid"
+    )
+
+
+def find_pairs(tests_dir: Path):
+    pairs = []
+    for orig in sorted(tests_dir.glob("*.original.md")):
+        comp = orig.with_name(orig.stem.removesuffix(".original") + ".md")
+        if comp.exists():
+            pairs.append((orig, comp))
+    return pairs
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Benchmark caveman compression")
+    parser.add_argument("pair", nargs="*", help="original.md compressed.md")
+    parser.add_argument("--dir", type=Path, help="directory of *.original.md / *.md pairs")
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--json", type=Path, help="also write the full report as JSON")
+    parser.add_argument("--model", action="store_true", help="also time a live compress call per file")
+    parser.add_argument("--imports", action="store_true", help="check and time CLI start-up imports instead")
+    args = parser.parse_args()
+
+    if args.imports:
+        report = benchmark_imports()
+        print_import_report(report)
+        if args.json:
+            args.json.write_text(json.dumps(report, indent=2) + "\n")
+        problems = import_violations(report)
+        for problem in problems:
+            print(f"❌ {problem}")
+        if problems:
+            sys.exit(1)
+        print("\n✅ Skip path imports only detect")
+        return
+
     # Direct file pair: python3 benchmark.py original.md compressed.md
-    if len(sys.argv) == 3:
-        orig = Path(sys.argv[1]).resolve()
-        comp = Path(sys.argv[2]).resolve()
+    if len(args.pair) == 2:
+        orig = Path(args.pair[0]).resolve()
+        comp = Path(args.pair[1]).resolve()
         if not orig.exists():
             print(f"❌ Not found: {orig}")
             sys.exit(1)
         if not comp.exists():
             print(f"❌ Not found: {comp}")
             sys.exit(1)
-        print_table([benchmark_pair(orig, comp)])
-        return
-
-    # Glob mode: repo_root/tests/caveman-compress/
-    tests_dir = Path(__file__).parent.parent.parent / "tests" / "caveman-compress"
-    if not tests_dir.exists():
-        print(f"❌ Tests dir not found: {tests_dir}")
-        sys.exit(1)
-
-    rows = []
-    for orig in sorted(tests_dir.glob("*.original.md")):
-        comp = orig.with_name(orig.stem.removesuffix(".original") + ".md")
-        if comp.exists():
-            rows.append(benchmark_pair(orig, comp))
+        pairs = [(orig, comp)]
+    elif args.pair:
+        parser.error("expected exactly two files: original compressed")
+    else:
+        # Glob mode: repo_root/tests/caveman-compress/
+        tests_dir = args.dir or Path(__file__).parent.parent.parent / "tests" / "caveman-compress"
+        if not tests_dir.exists():
+            print(f"❌ Tests dir not found: {tests_dir}")
+            sys.exit(1)
+        pairs = find_pairs(tests_dir)
 
-    if not rows:
+    if not pairs:
         print("No compressed file pairs found.")
         return
 
-    print_table(rows)
+    report = run_benchmark(pairs, jobs=args.jobs, model=args.model)
+    print_report(report)
+
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2, default=str) + "\n")
+        print(f"JSON report: {args.json}")
 
 
 if __name__ == "__main__":
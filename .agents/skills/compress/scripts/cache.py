@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""Content-addressed on-disk cache of compressed outputs.
+
+Entries are keyed by SHA-256 over the original text, the compress prompt
+template and the model, so identical boilerplate compresses once per
+model/prompt combination and is served locally afterwards. Storage is a
+single SQLite file with size-based LRU eviction.
+"""
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Optional
+
+DEFAULT_MAX_BYTES = int(float(os.environ.get("CAVEMAN_CACHE_MAX_MB", "64")) * 1024 * 1024)
+
+
+def default_cache_dir() -> Path:
+    if os.environ.get("CAVEMAN_CACHE_DIR"):
+        return Path(os.environ["CAVEMAN_CACHE_DIR"]).expanduser()
+    base = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(base) / "caveman"
+
+
+def cache_enabled() -> bool:
+    return os.environ.get("CAVEMAN_CACHE", "1").lower() not in ("0", "false", "no", "off")
+
+
+def cache_key(text: str, prompt_template: str, model: str) -> str:
+    h = hashlib.sha256()
+    for part in (model, prompt_template, text):
+        data = part.encode("utf-8", errors="surrogatepass")
+        h.update(len(data).to_bytes(8, "big"))
+        h.update(data)
+    return h.hexdigest()
+
+
+class CompressionCache:
+    def __init__(self, path: Optional[Path] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = Path(path) if path else default_cache_dir() / "compress.sqlite3"
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(str(self.path), timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS entries (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                model TEXT NOT NULL,
+                created REAL NOT NULL,
+                last_used REAL NOT NULL
+            )"""
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS entries_lru ON entries(last_used)")
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, key: str, value: str, model: str = ""):
+        size = len(value.encode("utf-8", errors="surrogatepass"))
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, model, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, value, size, model, now, now),
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self):
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM entries ORDER BY last_used ASC"
+        ).fetchall():
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+        }
+
+    def reset_stats(self):
+        """Zero the hit/miss/eviction counters (entries are kept)."""
+        with self._lock:
+            self.hits = self.misses = self.evictions = 0
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._conn.commit()
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_cache() -> Optional[CompressionCache]:
+    """Process-wide cache, or None when disabled via CAVEMAN_CACHE=0."""
+    global _cache
+    if not cache_enabled():
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = CompressionCache()
+        return _cache
+
+
+def reset_cache_stats():
+    """Start the process-wide cache's counters over, e.g. per daemon request."""
+    if _cache is not None:
+        _cache.reset_stats()
+
+
+def print_cache_report(cache: Optional[CompressionCache] = None):
+    cache = cache or _cache
+    if cache is None:
+        return
+    s = cache.stats()
+    print(
+        f"Cache: {s['hits']} hits, {s['misses']} misses "
+        f"({100 * s['hit_rate']:.0f}% hit rate), {s['evictions']} evicted, "
+        f"{s['entries']} entries, {s['bytes'] / 1024:.0f}KB / {s['max_bytes'] / 1024:.0f}KB"
+    )
+
+
+# ---------- CLI ----------
+
+if __name__ == "__main__":
+    import sys
+
+    c = CompressionCache()
+    if len(sys.argv) > 1 and sys.argv[1] == "--clear":
+        c.clear()
+        print(f"Cleared {c.path}")
+    print(f"Cache file: {c.path}")
+    print_cache_report(c)
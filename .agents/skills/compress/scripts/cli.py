@@ -4,25 +4,222 @@ Caveman Compress CLI
 
 Usage:
     caveman <filepath>
+    caveman [--jobs N] <file|directory|glob> [...]
+    caveman --local <filepath>        (lexical rules only, no model call)
+    caveman --precompress <filepath>  (lexical rules before the model call)
+    caveman --budget N <filepath>     (cheapest compression level fitting N tokens)
+    caveman --profile ...             (print where the time went)
+
+When a daemon (``python3 -m scripts.daemon``) is listening, the CLI only
+forwards its arguments over the daemon's socket and prints the reply.
 """
 
+import argparse
+import os
 import sys
 from pathlib import Path
+from typing import Optional
+
+# Nothing from the package is imported up front: editor hooks run the CLI
+# on every save. With a daemon running the CLI is only a socket client;
+# otherwise most runs end at should_compress, so detect is imported first
+# and the compress pipeline (and the SDK/tokenizer behind it) only once a
+# file is known to need it.
 
-from .compress import compress_file
-from .detect import detect_file_type, should_compress
+CONNECT_TIMEOUT = 0.5
+
+# Settings of the daemon itself; every other CAVEMAN_* variable must match
+# between client and daemon for a run to be forwarded.
+DAEMON_ONLY_ENV = frozenset({"CAVEMAN_DAEMON", "CAVEMAN_SOCKET", "CAVEMAN_DEBOUNCE"})
 
 
 def print_usage():
     print("Usage: caveman <filepath>")
+    print("       caveman [--jobs N] <file|directory|glob> [...]")
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog="caveman", add_help=True)
+    parser.add_argument("targets", nargs="*")
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=None,
+        help="concurrent compressions in batch mode (default: $CAVEMAN_JOBS or 4)",
+    )
+    parser.add_argument(
+        "--async", dest="use_async", action="store_true",
+        help="batch mode: one event loop with a rate-limit-aware scheduler ($CAVEMAN_RPM/$CAVEMAN_TPM)",
+    )
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument(
+        "--local", action="store_true",
+        help="offline: apply the lexical compression rules only, no model call",
+    )
+    mode.add_argument(
+        "--precompress", action="store_true",
+        help="apply the lexical rules locally before sending text to the model",
+    )
+    parser.add_argument(
+        "--budget", type=int, default=None, metavar="TOKENS",
+        help="token budget: try local rules, standard, then aggressive compression; stop at the first that fits",
+    )
+    parser.add_argument(
+        "--profile", action="store_true",
+        help="print a per-stage timing breakdown (detect, read, prompt, model, validate, write)",
+    )
+    return parser.parse_args(argv)
+
+
+# ---------- Daemon Client ----------
+
+
+def daemon_enabled() -> bool:
+    return os.environ.get("CAVEMAN_DAEMON", "1").lower() not in ("0", "false", "no", "off")
+
+
+def socket_path() -> Path:
+    """Daemon socket: ``CAVEMAN_SOCKET``, else ``daemon.sock`` in the cache directory."""
+    if os.environ.get("CAVEMAN_SOCKET"):
+        return Path(os.environ["CAVEMAN_SOCKET"]).expanduser()
+    # Same directory as cache.default_cache_dir, without importing it
+    base = os.environ.get("CAVEMAN_CACHE_DIR") or Path(os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache") / "caveman"
+    return Path(base).expanduser() / "daemon.sock"
+
+
+# Outside CAVEMAN_*: where caches live, and whose account the model calls use
+RUN_ENV = ("HOME", "XDG_CACHE_HOME")
+
+
+def run_env() -> dict:
+    """The environment settings of this process that affect a run.
+
+    ``CAVEMAN_*`` plus :data:`RUN_ENV`; the API key only as a hash, since it
+    is sent over the daemon socket.
+    """
+    import hashlib
+
+    env = {k: v for k, v in os.environ.items() if k.startswith("CAVEMAN_") and k not in DAEMON_ONLY_ENV}
+    env.update((k, os.environ[k]) for k in RUN_ENV if k in os.environ)
+    key = os.environ.get("ANTHROPIC_API_KEY")
+    if key:
+        env["ANTHROPIC_API_KEY_SHA256"] = hashlib.sha256(key.encode()).hexdigest()
+    return env
+
+
+def request_daemon(request: dict) -> Optional[dict]:
+    """Send ``request`` to a running daemon and return its reply; None if none answers."""
+    path = socket_path()
+    if not path.exists():
+        return None
+    import json
+    import socket
+
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    data = b""
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as conn:
+            conn.settimeout(CONNECT_TIMEOUT)
+            conn.connect(str(path))
+            conn.settimeout(None)  # a compression may take a while
+            conn.sendall((json.dumps(request) + "\n").encode())
+            while True:
+                chunk = conn.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+    except OSError:
+        return None  # stale socket or daemon gone: run in-process
+    try:
+        return json.loads(data)
+    except ValueError:
+        return None
+
+
+def forward_to_daemon(argv) -> Optional[int]:
+    """Run ``argv`` in the daemon, printing its output; the exit code, or None.
+
+    The daemon declines runs whose settings (:func:`run_env`) differ from
+    its own, most being read at import time, and runs that would queue
+    behind one already in progress; those run in-process instead.
+    """
+    reply = request_daemon({"cmd": "run", "argv": list(argv), "cwd": os.getcwd(), "env": run_env()})
+    if reply is None or "declined" in reply:
+        return None
+    sys.stdout.write(reply.get("output", ""))
+    sys.stdout.flush()
+    return reply.get("code", 0)
+
+
+def is_batch(args) -> bool:
+    if args.jobs is not None or args.use_async or len(args.targets) != 1:
+        return True
+    target = args.targets[0]
+    return Path(target).is_dir() or any(c in target for c in "*?[")
+
+
+def main_batch(args):
+    from .backends import print_usage_report
+    from .batch import DEFAULT_JOBS, print_status_table, run_batch
+    from .cache import print_cache_report
+
+    jobs = args.jobs if args.jobs is not None else DEFAULT_JOBS
+    print(f"Starting caveman batch compression ({jobs} workers)...\n")
+
+    try:
+        results = run_batch(
+            args.targets, jobs=jobs, use_async=args.use_async,
+            local=args.local, precompress=args.precompress, budget=args.budget,
+        )
+    except KeyboardInterrupt:
+        print("\nInterrupted by user")
+        sys.exit(130)
+
+    if not results:
+        print("No files matched.")
+        sys.exit(0)
+
+    print_status_table(results)
+    print_cache_report()
+    print_usage_report()
+
+    if any(r.status == "error" for r in results):
+        sys.exit(1)
+    if any(r.status == "failed" for r in results):
+        sys.exit(2)
+    sys.exit(0)
 
 
 def main():
-    if len(sys.argv) != 2:
+    args = parse_args(sys.argv[1:])
+
+    if args.targets and not args.profile and daemon_enabled():
+        code = forward_to_daemon(sys.argv[1:])
+        if code is not None:
+            sys.exit(code)
+
+    if not args.profile:
+        run(args)
+        return
+
+    from .tracing import ProfileSink, add_sink
+
+    profile = add_sink(ProfileSink())
+    try:
+        run(args)
+    finally:
+        profile.report()
+
+
+def run(args):
+    if not args.targets:
         print_usage()
         sys.exit(1)
 
-    filepath = Path(sys.argv[1])
+    if is_batch(args):
+        main_batch(args)
+        return
+
+    filepath = Path(args.targets[0])
 
     # Check file exists
     if not filepath.exists():
@@ -35,26 +232,39 @@ def main():
 
     filepath = filepath.resolve()
 
-    # Detect file type
-    file_type = detect_file_type(filepath)
+    from .detect import FileProbe, detect_file_type, should_compress
+
+    # Detect file type; the probe's read is reused by compress_file
+    probe = FileProbe(filepath)
+    file_type = detect_file_type(filepath, probe)
 
     print(f"Detected: {file_type}")
 
     # Check if compressible
-    if not should_compress(filepath):
-        print("Skipping: file is not natural language (code/config)")
+    if not should_compress(filepath, probe):
+        print(f"Skipping: file is not natural language ({file_type})")
         sys.exit(0)
 
     print("Starting caveman compression...\n")
 
+    from .backends import print_usage_report
+    from .cache import print_cache_report
+    from .compress import compress_file
+
     try:
-        success = compress_file(filepath)
+        success = compress_file(
+            filepath, local=args.local, precompress=args.precompress, probe=probe, budget=args.budget
+        )
 
         if success:
-            print("\nCompression completed successfully")
             backup_path = filepath.with_name(filepath.stem + ".original.md")
-            print(f"Compressed: {filepath}")
-            print(f"Original:   {backup_path}")
+            # No backup: the file was already within its budget
+            if backup_path.exists():
+                print("\nCompression completed successfully")
+                print(f"Compressed: {filepath}")
+                print(f"Original:   {backup_path}")
+            print_cache_report()
+            print_usage_report()
             sys.exit(0)
         else:
             print("\n❌ Compression failed after retries")
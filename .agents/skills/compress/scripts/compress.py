@@ -6,11 +6,13 @@ Usage:
     python scripts/compress.py <filepath>
 """
 
+import asyncio
 import os
 import re
-import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List
+from typing import Dict, Generator, List, Optional, Sequence, TypeVar
 
 OUTER_FENCE_REGEX = re.compile(
     r"\A\s*(`{3,}|~{3,})[^\n]*\n(.*)\n\1\s*\Z", re.DOTALL
@@ -63,47 +65,161 @@ def strip_llm_wrapper(text: str) -> str:
         return m.group(2)
     return text
 
-from .detect import should_compress
-from .validate import validate
+from .backends import API_MAX_RETRIES, TransientError, backoff_delay, current_model, get_backend, get_usage
+from .cache import cache_key, get_cache
+from .detect import FileProbe, should_compress
+from .index import CURRENT, OUTDATED, get_index
+from .journal import recover_file, swap_in
+from .lexical import compress_text
+from .repair import repair
+from .retention import describe as describe_retention, low_retention
+from .scheduler import RateLimitScheduler
+from .secretscan import describe as describe_secrets, scan_enabled, scan_secrets
+from .sections import Section, align_sections, join_sections, split_sections
+from .sidecar import load_sidecar, sha256_text
+from .tokenizer import count_tokens, count_tokens_batch
+from .tracing import bind, span
+from .validate import Diverged, Fingerprint, check, fingerprint_text, store_fingerprint, stream_check
+
+T = TypeVar("T")
 
 MAX_RETRIES = 2
+# Compression levels a --budget run tries, cheapest first.
+BUDGET_TIERS = ("local", "model", "aggressive")
+SECTION_JOBS = int(os.environ.get("CAVEMAN_SECTION_JOBS", "4"))
 
 
-# ---------- Claude Calls ----------
-
+def stream_enabled() -> bool:
+    return os.environ.get("CAVEMAN_STREAM", "1").lower() not in ("0", "false", "no", "off")
 
-def call_claude(prompt: str) -> str:
-    api_key = os.environ.get("ANTHROPIC_API_KEY")
-    if api_key:
-        try:
-            import anthropic
 
-            client = anthropic.Anthropic(api_key=api_key)
-            msg = client.messages.create(
-                model=os.environ.get("CAVEMAN_MODEL", "claude-sonnet-4-5"),
-                max_tokens=8192,
-                messages=[{"role": "user", "content": prompt}],
-            )
-            return strip_llm_wrapper(msg.content[0].text.strip())
-        except ImportError:
-            pass  # anthropic not installed, fall back to CLI
-    # Fallback: use claude CLI (handles desktop auth)
-    try:
-        result = subprocess.run(
-            ["claude", "--print"],
-            input=prompt,
-            text=True,
-            capture_output=True,
-            check=True,
-        )
-        return strip_llm_wrapper(result.stdout.strip())
-    except subprocess.CalledProcessError as e:
-        raise RuntimeError(f"Claude call failed:\n{e.stderr}")
+# ---------- Claude Calls ----------
 
 
-def build_compress_prompt(original: str) -> str:
-    return f"""
-Compress this markdown into caveman format.
+class ModelRequest:
+    """A prompt, its cacheable system blocks and the text its answer should mirror.
+
+    With ``expect`` set (and streaming on) the answer is checked as it
+    streams in and stopped early once it diverges; see :class:`StreamCheck`.
+    """
+
+    __slots__ = ("prompt", "expect", "system")
+
+    def __init__(self, prompt: str, expect: Optional[str] = None, system: Sequence[str] = ()):
+        self.prompt = prompt
+        self.expect = expect
+        self.system = tuple(system)
+
+
+def _record_usage(s, completion):
+    s.set(
+        input_tokens=completion.input_tokens,
+        output_tokens=completion.output_tokens,
+        cache_read_tokens=completion.cache_read_tokens,
+        cache_write_tokens=completion.cache_write_tokens,
+    )
+    get_usage().record(completion)
+
+
+def _on_diverged(s, prompt: str, check, error: Diverged) -> str:
+    """Record a stopped answer and return the prompt to restart with."""
+    s.add("aborted")
+    s.add("aborted_chars", check.chars)
+    print(f"⚠️ Stopped answer early ({error}); retrying")
+    return build_hint_prompt(prompt, str(error))
+
+
+def call_claude(prompt: str, expect: Optional[str] = None, system: Sequence[str] = ()) -> str:
+    """Send ``prompt`` to the configured backend (see backends.py).
+
+    ``system`` blocks are static instructions sent ahead of the prompt and
+    marked for provider-side prompt caching.
+
+    With ``expect`` the answer is streamed through a structural check
+    against it. A diverging answer is stopped and the request restarted
+    at once with the reason as a hint; that second answer is not checked
+    early and goes through the usual validate/repair/fix loop.
+    """
+    backend = get_backend()
+    checked = expect is not None and stream_enabled()
+    retries = 0
+    with span("model", backend=backend.name) as s:
+        while True:
+            check = stream_check(expect) if checked else None
+            try:
+                completion = backend.complete(prompt, check.feed if check else None, system)
+            except TransientError as e:
+                if retries == API_MAX_RETRIES:
+                    raise
+                delay = e.retry_after if e.retry_after is not None else backoff_delay(retries)
+                retries += 1
+                s.add("retries")
+                s.add("retry_wait", delay)
+                time.sleep(delay)
+                continue
+            except Diverged as e:
+                prompt, checked = _on_diverged(s, prompt, check, e), False
+                continue
+            _record_usage(s, completion)
+            return strip_llm_wrapper(completion.text.strip())
+
+
+async def call_claude_async(
+    prompt: str,
+    scheduler: Optional[RateLimitScheduler] = None,
+    expect: Optional[str] = None,
+    system: Sequence[str] = (),
+) -> str:
+    """Async :func:`call_claude`; dispatch is paced by ``scheduler`` when given."""
+    backend = get_backend()
+    # System blocks are input too: reserve for them uncached, the worst case;
+    # on_success then settles on what the call actually counted
+    estimate = sum(count_tokens_batch([prompt, *system]))
+    checked = expect is not None and stream_enabled()
+    retries = 0
+    with span("model", backend=backend.name) as s:
+        while True:
+            if scheduler:
+                queued = time.perf_counter()
+                ticket = await scheduler.acquire(estimate)
+                s.add("queue_wait", time.perf_counter() - queued)
+            else:
+                ticket = None
+            check = stream_check(expect) if checked else None
+            try:
+                completion = await backend.acomplete(prompt, check.feed if check else None, system)
+            except TransientError as e:
+                if retries == API_MAX_RETRIES:
+                    raise
+                s.add("retries")
+                if scheduler:
+                    scheduler.on_rate_limited(e.retry_after)
+                else:
+                    delay = e.retry_after if e.retry_after is not None else backoff_delay(retries)
+                    s.add("retry_wait", delay)
+                    await asyncio.sleep(delay)
+                retries += 1
+                continue
+            except Diverged as e:
+                prompt, checked = _on_diverged(s, prompt, check, e), False
+                continue
+            if scheduler:
+                scheduler.on_success(ticket, completion.rate_limited_tokens)
+            _record_usage(s, completion)
+            return strip_llm_wrapper(completion.text.strip())
+
+
+# Static instructions go in one system block marked for provider-side
+# prompt caching, so every call after the first in a run reuses it; only
+# the document varies per call. Compress and fix calls share the block,
+# and it carries worked examples: a prefix below the provider's minimum
+# cacheable size (CACHE_MIN_TOKENS) is never cached at all. The detailed
+# rules are read from SKILL.md (the same rules the skill documents).
+SKILL_PATH = Path(__file__).resolve().parent.parent / "SKILL.md"
+
+TASKS_INTRO = """You compress markdown into caveman format, or fix a caveman-compressed file that failed validation. The user message says which: a message with "TEXT:" asks for compression, one starting with "ERRORS TO FIX:" asks for a fix."""
+
+COMPRESS_INSTRUCTIONS = """## Task: compress
 
 STRICT RULES:
 - Do NOT modify anything inside ``` code blocks
@@ -113,16 +229,11 @@ STRICT RULES:
 - Preserve file paths and commands
 - Return ONLY the compressed markdown body — do NOT wrap the entire output in a ```markdown fence or any other fence. Inner code blocks from the original stay as-is; do not add a new outer fence around the whole file.
 
-Only compress natural language.
+Only compress natural language."""
 
-TEXT:
-{original}
-"""
+FIX_INSTRUCTIONS = """## Task: fix
 
-
-def build_fix_prompt(original: str, compressed: str, errors: List[str]) -> str:
-    errors_str = "\n".join(f"- {e}" for e in errors)
-    return f"""You are fixing a caveman-compressed markdown file. Specific validation errors were found.
+The COMPRESSED file has specific validation errors, listed in the message.
 
 CRITICAL RULES:
 - DO NOT recompress or rephrase the file
@@ -130,15 +241,149 @@ CRITICAL RULES:
 - The ORIGINAL is provided as reference only (to restore missing content)
 - Preserve caveman style in all untouched sections
 
-ERRORS TO FIX:
-{errors_str}
-
 HOW TO FIX:
 - Missing URL: find it in ORIGINAL, restore it exactly where it belongs in COMPRESSED
 - Code block mismatch: find the exact code block in ORIGINAL, restore it in COMPRESSED
 - Heading mismatch: restore the exact heading text from ORIGINAL into COMPRESSED
 - Do not touch any section not mentioned in the errors
 
+Return ONLY the fixed compressed file. No explanation."""
+
+EXAMPLES = """## Worked examples
+
+### Compress: prose around a code block
+
+TEXT:
+## Local setup
+
+Before you start working on the project, you should make sure that you have Node.js 20 or newer installed on your machine. After that, it is a good idea to install all of the dependencies by running the following command in the root of the repository:
+
+```bash
+npm install   # also runs the postinstall hook
+```
+
+If you run into any problems during the installation, please take a look at the troubleshooting guide at https://example.com/docs/troubleshooting before opening an issue.
+
+Output:
+## Local setup
+
+Need Node.js 20+. Install deps from repo root:
+
+```bash
+npm install   # also runs the postinstall hook
+```
+
+Install problems: see https://example.com/docs/troubleshooting before opening issue.
+
+### Compress: lists, inline code and paths
+
+TEXT:
+### Conventions
+
+- All of the React components should be placed in the `src/components/` directory, and each one of them should have its own folder.
+- We generally prefer to use named exports rather than default exports, because they make it easier to refactor things later on.
+- Please remember to run `npm run lint` and also `npm test` before you push any of your changes.
+  - The CI pipeline will reject the pull request if either one of them fails.
+
+Output:
+### Conventions
+
+- React components go in `src/components/`, one folder each.
+- Prefer named exports over default — easier refactors.
+- Run `npm run lint` + `npm test` before push.
+  - CI rejects PR if either fails.
+
+### Compress: a table and a numbered list
+
+TEXT:
+| Variable | What it does |
+|----------|--------------|
+| `NODE_ENV` | This variable controls whether the application runs in development or in production mode. |
+| `PORT` | This is the port number that the server is going to listen on (the default is 3000). |
+
+1. First of all, create a new branch from `main` for the feature you are working on.
+2. Once you are done, open a pull request and ask at least one other person to review it.
+
+Output:
+| Variable | What it does |
+|----------|--------------|
+| `NODE_ENV` | Dev or production mode. |
+| `PORT` | Server port (default 3000). |
+
+1. Branch from `main` per feature.
+2. When done, open PR, get 1+ reviewer.
+
+### Fix: restore a lost URL only
+
+ERRORS TO FIX:
+- URL mismatch: lost={'https://example.com/api'}, added=set()
+
+ORIGINAL (reference only):
+The full reference for every endpoint can be found in the API documentation at https://example.com/api, which is updated on each release.
+
+COMPRESSED (fix this):
+Full endpoint reference in API docs, updated each release.
+
+Output:
+Full endpoint reference in API docs (https://example.com/api), updated each release."""
+
+AGGRESSIVE_INSTRUCTIONS = """AGGRESSIVE MODE: the result must fit a tight token budget.
+- Drop examples, rationale, background and anything stated twice
+- Keep every instruction, constraint, number and name
+- One terse line per point; merge related bullets
+- Use symbols and short forms (→, =, &, w/, w/o, cfg, env, dir, repo, fn)
+- Code blocks, inline code, URLs, paths, commands and headings still stay exactly as-is"""
+
+_instructions_block: Optional[str] = None
+
+
+def _skill_rules() -> str:
+    """The "Compression Rules" and "Pattern" sections of SKILL.md ("" if unavailable)."""
+    try:
+        text = SKILL_PATH.read_text(errors="ignore")
+    except OSError:
+        return ""
+    start = text.find("## Compression Rules")
+    end = text.find("## Boundaries")
+    return text[start:end].strip() if 0 <= start < end else ""
+
+
+def instructions_block() -> str:
+    """The static system block shared by compress and fix calls."""
+    global _instructions_block
+    if _instructions_block is None:
+        parts = [TASKS_INTRO, COMPRESS_INSTRUCTIONS, FIX_INSTRUCTIONS, _skill_rules(), EXAMPLES]
+        _instructions_block = "\n\n".join(p for p in parts if p)
+    return _instructions_block
+
+
+def compress_system(mode: str = "model") -> List[str]:
+    """System blocks of a compress call; each is a prompt-cache breakpoint.
+
+    The "aggressive" tier appends its own block, so the shared one stays cached.
+    """
+    block = instructions_block()
+    return [block, AGGRESSIVE_INSTRUCTIONS] if mode == "aggressive" else [block]
+
+
+def fix_system() -> List[str]:
+    """System blocks of a fix call: the same cached block as compress calls."""
+    return [instructions_block()]
+
+
+def build_compress_prompt(original: str) -> str:
+    return f"""Compress this markdown into caveman format.
+
+TEXT:
+{original}
+"""
+
+
+def build_fix_prompt(original: str, compressed: str, errors: List[str]) -> str:
+    errors_str = "\n".join(f"- {e}" for e in errors)
+    return f"""ERRORS TO FIX:
+{errors_str}
+
 ORIGINAL (reference only):
 {original}
 
@@ -149,12 +394,303 @@ Return ONLY the fixed compressed file. No explanation.
 """
 
 
+def build_hint_prompt(prompt: str, reason: str) -> str:
+    """``prompt`` restarted after its previous answer was stopped for ``reason``."""
+    return f"""NOTE: a previous answer to this request was stopped because of this problem: {reason}.
+Keep every heading exactly once and in the original order, and return only the compressed text.
+
+{prompt}"""
+
+
+def prompt_version(mode: str = "model") -> str:
+    """Short hash of the compress prompt template, recorded with each result."""
+    return sha256_text("\n".join(compress_system(mode)) + build_compress_prompt(""))[:12]
+
+
+def compress_cache_key(original: str, mode: str = "model") -> str:
+    """Cache key for a compress call: input text + prompt template + model."""
+    return cache_key(original, "\n".join(compress_system(mode)) + build_compress_prompt(""), current_model())
+
+
+def budget_tiers(mode: str) -> List[str]:
+    """Tiers a --budget run tries, cheapest first; ``mode`` replaces the standard one.
+
+    A local run never calls the model, so it has only the lexical tier.
+    """
+    if mode == "local":
+        return ["local"]
+    return ["local", mode, "aggressive"]
+
+
+# ---------- Sections ----------
+
+
+def _model_input(text: str, mode: str) -> str:
+    return compress_text(text) if mode in ("precompress", "aggressive") else text
+
+
+def _compress_sections(
+    sections: List[Section],
+    previous: Optional[Dict[str, str]] = None,
+    mode: str = "model",
+) -> Generator[List[ModelRequest], List[str], List[str]]:
+    """Compress sections independently.
+
+    Sections whose hash is in ``previous`` (hash -> compressed text from the
+    last run) or in the cache are reused; heading-only sections pass through.
+    ``mode`` is "model" (send as-is), "precompress" (apply the local lexical
+    pass before sending), "aggressive" (lexical pass, then the model with
+    the aggressive instructions) or "local" (lexical pass only, no model call).
+
+    Yields one list of :class:`ModelRequest` for all sections that need the
+    model and is sent their outputs, so sync and async drivers can dispatch
+    them concurrently in their own way.
+    """
+    previous = previous or {}
+    cache = get_cache() if mode != "local" else None
+    results: List[Optional[str]] = [None] * len(sections)
+    todo = []
+    reused = hits = 0
+
+    with span("reuse", sections=len(sections)):
+        for i, section in enumerate(sections):
+            if not section.has_body:
+                results[i] = section.text
+            elif section.hash in previous:
+                results[i] = previous[section.hash]
+                reused += 1
+            elif mode == "local":
+                results[i] = compress_text(section.text)
+            else:
+                cached = cache.get(compress_cache_key(_model_input(section.text, mode), mode)) if cache else None
+                if cached is not None:
+                    results[i] = cached
+                    hits += 1
+                else:
+                    todo.append(i)
+
+    if reused:
+        print(f"Reusing {reused} unchanged section(s)")
+    if hits:
+        print(f"Cache hit for {hits} section(s)")
+    if todo:
+        with span("prompt", prompts=len(todo)):
+            inputs = [_model_input(sections[i].text, mode) for i in todo]
+            if mode in ("precompress", "aggressive"):
+                report_savings("Pre-compressed locally", [sections[i].text for i in todo], inputs)
+            requests = [ModelRequest(build_compress_prompt(text), text, compress_system(mode)) for text in inputs]
+        print(f"Compressing {len(todo)} section(s) with Claude...")
+        outputs = yield requests
+        for i, out in zip(todo, outputs):
+            results[i] = out
+    return results
+
+
+def report_savings(label: str, before: List[str], after: List[str]):
+    """Print token savings of a local pass, measured like benchmark.py."""
+    b = sum(count_tokens_batch(before))
+    a = sum(count_tokens_batch(after))
+    saved = 100 * (b - a) / b if b else 0.0
+    print(f"{label}: {b} -> {a} tokens ({saved:.1f}% saved)")
+
+
+def locate_failures(sections: List[Section], section_fps: List[Fingerprint], compressed: str):
+    """Map validation failures of ``compressed`` onto original sections.
+
+    Returns ``(aligned, [(index, ValidationResult), ...])`` when the output
+    still has the original section structure and at least one section
+    fails on its own; None when only a whole-document fix can help (the
+    structure broke, or content moved between sections).
+    """
+    aligned = align_sections(sections, compressed)
+    if aligned is None:
+        return None
+    failing = []
+    for i, (fp, part) in enumerate(zip(section_fps, aligned)):
+        res = check(fp, part.text)
+        if not res.is_valid:
+            failing.append((i, res))
+    return (aligned, failing) if failing else None
+
+
+def _previous_sections(manifest: dict, previous_output: str, mode: str) -> Dict[str, str]:
+    if manifest.get("mode", "model") != mode:
+        return {}
+    hashes = manifest.get("sections") or []
+    parts = split_sections(previous_output)
+    if len(hashes) != len(parts):
+        return {}
+    return {h: part.text for h, part in zip(hashes, parts)}
+
+
+def _updatable_manifest(filepath: Path) -> Optional[dict]:
+    """Sidecar manifest, if ``filepath`` is still exactly our last compressed output.
+
+    Falls back to the repo index entry when the sidecar is missing.
+    """
+    manifest = load_sidecar(filepath)
+    if not manifest.get("output_sha256"):
+        index = get_index(filepath)
+        manifest = (index.get(filepath) if index else None) or {}
+    output_hash = manifest.get("output_sha256")
+    if not output_hash:
+        return None
+    try:
+        current = filepath.read_text(errors="ignore")
+    except OSError:
+        return None
+    return manifest if sha256_text(current) == output_hash else None
+
+
+def can_update(filepath: Path) -> bool:
+    """True if an existing backup for ``filepath`` may be recompressed incrementally."""
+    return _updatable_manifest(filepath.resolve()) is not None
+
+
+def _outdated(manifest: dict, mode: str, budget: Optional[int] = None) -> bool:
+    """True if ``manifest`` was written under another mode, model, prompt or budget.
+
+    With a ``budget`` any of its tiers counts as the same mode.
+    """
+    if budget is not None:
+        if manifest.get("budget") != budget or manifest.get("mode", "model") not in budget_tiers(mode):
+            return True
+        mode = manifest.get("mode", "model")
+    if manifest.get("mode", "model") != mode:
+        return True
+    if mode == "local":
+        return False
+    recorded = manifest.get("prompt_version")
+    return manifest.get("model") != current_model() or (recorded is not None and recorded != prompt_version(mode))
+
+
+def index_status(filepath: Path, mode: str = "model", budget: Optional[int] = None) -> Optional[str]:
+    """Index status of ``filepath`` under the current settings; None without an index."""
+    index = get_index(filepath)
+    if index is None:
+        return None
+    filepath = filepath.resolve()
+    if budget is not None:
+        entry = index.get(filepath) or {}
+        recorded = entry.get("mode", "model")
+        if recorded in budget_tiers(mode):
+            mode = recorded
+        status = index.status(filepath, mode=mode, model=current_model(), prompt_version=prompt_version(mode))
+        return OUTDATED if status == CURRENT and entry.get("budget") != budget else status
+    return index.status(filepath, mode=mode, model=current_model(), prompt_version=prompt_version(mode))
+
+
+def _index_fields(original_text: str, compressed: str, mode: str, budget: Optional[int] = None) -> dict:
+    original_tokens, compressed_tokens = count_tokens_batch([original_text, compressed])
+    return dict(
+        status="compressed",
+        original_sha256=sha256_text(original_text),
+        output_sha256=sha256_text(compressed),
+        model=current_model() if mode != "local" else None,
+        mode=mode,
+        prompt_version=prompt_version(mode),
+        budget=budget,
+        original_tokens=original_tokens,
+        compressed_tokens=compressed_tokens,
+    )
+
+
+def _index_record(filepath: Path, original_text: str, compressed: str, mode: str, budget: Optional[int] = None):
+    index = get_index(filepath)
+    if index is not None:
+        index.record(filepath, **_index_fields(original_text, compressed, mode, budget))
+
+
+def _commit_success(
+    filepath: Path,
+    original_text: str,
+    sections: List[Section],
+    compressed: str,
+    mode: str,
+    updating: bool,
+    previous_output: str,
+    budget: Optional[int] = None,
+):
+    """Cache the sections, then swap the validated result onto disk atomically."""
+    aligned = align_sections(sections, compressed)
+    cache = get_cache() if mode != "local" else None
+    if aligned is not None and cache:
+        for orig, comp in zip(sections, aligned):
+            if orig.has_body:
+                key = compress_cache_key(_model_input(orig.text, mode), mode)
+                cache.put(key, comp.text.strip("\n"), model=current_model())
+    sidecar = dict(
+        original_sha256=sha256_text(original_text),
+        output_sha256=sha256_text(compressed),
+        sections=[s.hash for s in sections] if aligned is not None else [],
+        model=current_model() if mode != "local" else None,
+        mode=mode,
+        prompt_version=prompt_version(mode),
+        budget=budget,
+    )
+    index_fields = _index_fields(original_text, compressed, mode, budget) if get_index(filepath) else None
+    with span("write", bytes=len(compressed.encode())):
+        swap_in(
+            filepath, original_text, compressed,
+            created_backup=not updating,
+            previous_output=previous_output,
+            sidecar=sidecar,
+            index_fields=index_fields,
+        )
+
+
+# ---------- Drivers ----------
+
+
+def _call(request: ModelRequest) -> str:
+    return call_claude(request.prompt, request.expect, request.system)
+
+
+def _call_many(requests: List[ModelRequest]) -> List[str]:
+    if len(requests) == 1:
+        return [_call(requests[0])]
+    with ThreadPoolExecutor(max_workers=min(SECTION_JOBS, len(requests))) as pool:
+        return list(pool.map(bind(_call), requests))
+
+
+def _drive(pipeline: Generator[List[ModelRequest], List[str], T]) -> T:
+    """Run a pipeline generator, answering each yielded request batch with call_claude."""
+    try:
+        requests = next(pipeline)
+        while True:
+            requests = pipeline.send(_call_many(requests))
+    except StopIteration as stop:
+        return stop.value
+
+
+async def _drive_async(pipeline: Generator[List[ModelRequest], List[str], T], scheduler=None) -> T:
+    """Async counterpart of :func:`_drive` using :func:`call_claude_async`."""
+    try:
+        requests = next(pipeline)
+        while True:
+            outputs = await asyncio.gather(
+                *(call_claude_async(r.prompt, scheduler, r.expect, r.system) for r in requests)
+            )
+            requests = pipeline.send(list(outputs))
+    except StopIteration as stop:
+        return stop.value
+
+
 # ---------- Core Logic ----------
 
 
-def compress_file(filepath: Path) -> bool:
+def _compress_pipeline(
+    filepath: Path, mode: str, probe: Optional[FileProbe] = None, budget: Optional[int] = None
+) -> Generator[List[ModelRequest], List[str], bool]:
+    """The compress -> validate -> fix pipeline, with model calls left to the driver.
+
+    With a token ``budget`` the tiers of :func:`budget_tiers` are tried in
+    order until one result fits; files already within it are left alone.
+    """
+    local = mode == "local"
     # Resolve and validate path
     filepath = filepath.resolve()
+    probe = probe or FileProbe(filepath)
     MAX_FILE_SIZE = 500_000  # 500KB
     if not filepath.exists():
         raise FileNotFoundError(f"File not found: {filepath}")
@@ -175,53 +711,233 @@ def compress_file(filepath: Path) -> bool:
 
     print(f"Processing: {filepath}")
 
-    if not should_compress(filepath):
+    with span("detect"):
+        compressible = should_compress(filepath, probe)
+    if not compressible:
         print("Skipping (not natural language)")
         return False
 
-    original_text = filepath.read_text(errors="ignore")
+    # Finish or undo a swap an earlier, interrupted run left half done
+    recovered = recover_file(filepath)
+    if recovered:
+        print(f"Recovered interrupted run: {recovered}")
+
     backup_path = filepath.with_name(filepath.stem + ".original.md")
+    reusable: Optional[dict] = None  # manifest whose sections may be reused
+    updating = False
 
-    # Check if backup already exists to prevent accidental overwriting
     if backup_path.exists():
-        print(f"⚠️ Backup file already exists: {backup_path}")
-        print("The original backup may contain important content.")
-        print("Aborting to prevent data loss. Please remove or rename the backup file if you want to proceed.")
+        # A backup is only safe to build on when the compressed file is still
+        # exactly what we wrote last time; then the backup is the source of
+        # truth and only its changed sections are recompressed.
+        manifest = _updatable_manifest(filepath)
+        if manifest is None:
+            print(f"⚠️ Backup file already exists: {backup_path}")
+            print("The original backup may contain important content.")
+            print("Aborting to prevent data loss. Please remove or rename the backup file if you want to proceed.")
+            return False
+        with span("read"):
+            original_text = backup_path.read_text(errors="ignore")
+            previous_output = filepath.read_text(errors="ignore")
+        outdated = _outdated(manifest, mode, budget)
+        if sha256_text(original_text) == manifest.get("original_sha256") and not outdated:
+            print("Up to date — backup unchanged since last compression")
+            if index_status(filepath, mode, budget) != CURRENT:
+                _index_record(
+                    filepath, original_text, previous_output, manifest.get("mode", "model"), manifest.get("budget")
+                )
+            return True
+        if outdated:
+            # Sections compressed under other settings are not reused
+            print(f"Recompressing from backup (mode, model, prompt or budget changed): {backup_path}")
+        else:
+            print(f"Updating from backup: {backup_path}")
+            reusable = manifest
+        updating = True
+    else:
+        with span("read"):
+            original_text = probe.text()
+        previous_output = original_text
+        if budget is not None:
+            # Small files are left as they are: no tier, no model call
+            with span("budget"):
+                tokens = count_tokens(original_text)
+            if tokens <= budget:
+                print(f"Already within budget: {tokens} <= {budget} tokens, left as is")
+                return True
+
+    # Same boundary as is_sensitive_path, applied to the content about to be
+    # sent: known key formats and random-looking credentials stop the run.
+    if not local and scan_enabled():
+        with span("secrets"):
+            findings = scan_secrets(original_text)
+        if findings:
+            raise ValueError(
+                f"Refusing to compress {filepath}: content looks like it holds secrets "
+                f"({describe_secrets(findings)}). "
+                "Compression sends file contents to the Anthropic API. "
+                "Remove them, or use --local (no API call)."
+            )
+
+    # Step 1: Compress section by section (unchanged sections and cache hits
+    # are reused without a model call)
+    with span("split"):
+        sections = split_sections(original_text)
+
+    # Structure of the original is extracted once; every candidate is
+    # checked against it in memory.
+    with span("fingerprint"):
+        original_fp = fingerprint_text(original_text)
+        section_fps = [fingerprint_text(section.text) for section in sections]
+
+    # Candidates stay in memory until one validates; nothing on disk
+    # changes before that. With a budget each tier is tried in turn and
+    # the first whose result fits wins.
+    tiers = budget_tiers(mode) if budget is not None else [mode]
+    best = None  # (tokens, tier, compressed) of the smallest valid result
+    for tier in tiers:
+        if budget is not None:
+            print(f"\nTier {tier}:")
+        previous = _previous_sections(reusable, previous_output, tier) if reusable else {}
+        compressed = yield from _compress_validated(original_text, sections, original_fp, section_fps, previous, tier)
+        if compressed is None:
+            continue
+        if budget is None:
+            best = (0, tier, compressed)
+            break
+        with span("budget", tier=tier):
+            tokens = count_tokens(compressed)
+        if best is None or tokens < best[0]:
+            best = (tokens, tier, compressed)
+        if tokens <= budget:
+            print(f"Within budget: {tokens} <= {budget} tokens")
+            break
+        print(f"Over budget: {tokens} > {budget} tokens")
+
+    if best is None:
+        # Nothing was written; the file and any backup are untouched
+        index = get_index(filepath)
+        if index:
+            index.update(filepath, status="failed")
+        print("❌ Failed after retries — original left untouched")
         return False
 
-    # Step 1: Compress
-    print("Compressing with Claude...")
-    compressed = call_claude(build_compress_prompt(original_text))
+    tokens, tier, compressed = best
+    if budget is not None and tokens > budget:
+        print(f"⚠️ No tier fits {budget} tokens; keeping the smallest result ({tier}, {tokens} tokens)")
+    with span("retention"):
+        low = low_retention(original_text, compressed)
+    for r in low:
+        print(f"⚠️ {describe_retention(r)}")
+    _commit_success(filepath, original_text, sections, compressed, tier, updating, previous_output, budget)
+    store_fingerprint(backup_path, original_fp)
+    return True
+
 
-    # Save original as backup, write compressed to original path
-    backup_path.write_text(original_text)
-    filepath.write_text(compressed)
+def _compress_validated(
+    original_text: str,
+    sections: List[Section],
+    original_fp: Fingerprint,
+    section_fps: List[Fingerprint],
+    previous: Dict[str, str],
+    mode: str,
+) -> Generator[List[ModelRequest], List[str], Optional[str]]:
+    """Compress under ``mode``, then validate, repair and fix; None if it never validates."""
+    compressed = join_sections((yield from _compress_sections(sections, previous, mode)))
+    if mode == "local":
+        report_savings("Local pass", [original_text], [compressed])
 
     # Step 2: Validate + Retry
     for attempt in range(MAX_RETRIES):
         print(f"\nValidation attempt {attempt + 1}")
 
-        result = validate(backup_path, filepath)
+        result = check(original_fp, compressed)
+
+        if not result.is_valid:
+            # Most structural errors can be undone from the original locally
+            with span("repair"):
+                repaired = repair(original_text, compressed)
+            if repaired != compressed:
+                repaired_result = check(original_fp, repaired)
+                print(f"Repaired locally: {len(result.errors)} -> {len(repaired_result.errors)} error(s)")
+                if len(repaired_result.errors) <= len(result.errors):
+                    compressed, result = repaired, repaired_result
 
         if result.is_valid:
             print("Validation passed")
-            break
+            return compressed
 
         print("❌ Validation failed:")
         for err in result.errors:
             print(f"   - {err}")
 
-        if attempt == MAX_RETRIES - 1:
-            # Restore original on failure
-            filepath.write_text(original_text)
-            backup_path.unlink(missing_ok=True)
-            print("❌ Failed after retries — original restored")
-            return False
-
-        print("Fixing with Claude...")
-        compressed = call_claude(
-            build_fix_prompt(original_text, compressed, result.errors)
+        if attempt == MAX_RETRIES - 1 or mode == "local":
+            return None
+
+        with span("locate"):
+            targets = locate_failures(sections, section_fps, compressed)
+        if targets:
+            # Send only the broken sections and splice the fixes back in
+            aligned, failing = targets
+            print(f"Fixing {len(failing)} of {len(sections)} section(s) with Claude...")
+            for i, res in failing:
+                for issue in res.issues:
+                    print(f"   - {sections[i].label}: {issue}")
+            with span("prompt", prompts=len(failing), fix=True):
+                requests = [
+                    ModelRequest(
+                        build_fix_prompt(sections[i].text, aligned[i].text, [str(x) for x in res.issues]),
+                        sections[i].text,
+                        fix_system(),
+                    )
+                    for i, res in failing
+                ]
+            fixes = yield requests
+            parts = [part.text for part in aligned]
+            for (i, _), fixed in zip(failing, fixes):
+                parts[i] = fixed
+            compressed = join_sections(parts)
+        else:
+            print("Fixing with Claude...")
+            with span("prompt", prompts=1, fix=True):
+                prompt = build_fix_prompt(original_text, compressed, [str(x) for x in result.issues])
+            (compressed,) = yield [ModelRequest(prompt, original_text, fix_system())]
+    return None
+
+
+def compress_mode(local: bool = False, precompress: bool = False) -> str:
+    return "local" if local else "precompress" if precompress else "model"
+
+
+def compress_file(
+    filepath: Path,
+    local: bool = False,
+    precompress: bool = False,
+    probe: Optional[FileProbe] = None,
+    budget: Optional[int] = None,
+) -> bool:
+    """Compress ``filepath`` in place, keeping the original as ``*.original.md``.
+
+    ``local`` uses only the deterministic lexical pass (no model call);
+    ``precompress`` runs that pass before sending text to the model.
+    ``probe`` is the :class:`FileProbe` detection already used, so the
+    file is not read twice. ``budget`` (tokens) picks the cheapest
+    compression tier whose result fits.
+    """
+    with span("file", path=str(filepath)):
+        return _drive(_compress_pipeline(filepath, compress_mode(local, precompress), probe, budget))
+
+
+async def compress_file_async(
+    filepath: Path,
+    local: bool = False,
+    precompress: bool = False,
+    scheduler: Optional[RateLimitScheduler] = None,
+    probe: Optional[FileProbe] = None,
+    budget: Optional[int] = None,
+) -> bool:
+    """Async :func:`compress_file`; model calls are paced by ``scheduler``."""
+    with span("file", path=str(filepath)):
+        return await _drive_async(
+            _compress_pipeline(filepath, compress_mode(local, precompress), probe, budget), scheduler
         )
-        filepath.write_text(compressed)
-
-    return True
@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""Long-running compress daemon: one warm process behind a Unix socket.
+
+    python3 -m scripts.daemon [--local|--precompress] [--budget N] [--debounce S] [--poll] [PATH ...]
+    python3 -m scripts.daemon --stop
+
+The pipeline, API client, caches, index and memo tables are loaded once.
+While the daemon runs, ``python3 -m scripts ...`` forwards its arguments
+over the socket (see cli.py) and returns as soon as the daemon replies,
+with no interpreter start-up, imports or client creation of its own.
+
+Given PATHs (files or directories) are watched: inotify through ctypes on
+Linux, stat polling elsewhere. Edits are debounced, and a file is only
+recompressed when the text it compresses from (``FILE.original.md`` once
+a backup exists) hashed differently from the last run. Runs, from the
+socket or the watcher, go one at a time.
+"""
+
+import argparse
+import contextlib
+import ctypes
+import ctypes.util
+import io
+import json
+import os
+import select
+import signal
+import socket
+import socketserver
+import struct
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional
+
+from .backends import get_usage
+from .batch import SKIP_DIRS, _is_candidate, collect_files, run_batch
+from .cache import reset_cache_stats
+from .cli import run_env, parse_args, request_daemon, run, socket_path
+from .detect import COMPRESSIBLE_EXTENSIONS
+from .index import backup_path
+from .sidecar import sha256_text
+
+DEBOUNCE = float(os.environ.get("CAVEMAN_DEBOUNCE", "1.0"))
+# How long a client request waits for a run in progress before it is told
+# to run in-process: a hook's quick check must not sit behind a long batch.
+BUSY_WAIT = 0.5
+POLL_INTERVAL = 2.0
+
+# inotify(7)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_ISDIR = 0x40000000
+IN_CLOEXEC = 0o2000000
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+EVENT = struct.Struct("iIII")
+
+
+def _ignored_name(name: str) -> bool:
+    # Temp files of atomic writes, editor swap files, sidecars
+    return name.startswith(".") or name.endswith((".tmp", "~", ".swp", ".caveman.json"))
+
+
+def compressed_paths(backup: Path) -> List[Path]:
+    """Existing files whose backup is ``backup`` (``X.original.md`` -> ``X.md``, ``X.txt``, ``X``...)."""
+    stem = backup.name[: -len(".original.md")]
+    names = [stem] + [stem + ext for ext in sorted(COMPRESSIBLE_EXTENSIONS)]
+    return [p for p in (backup.with_name(n) for n in names) if p.is_file() and backup_path(p) == backup]
+
+
+# ---------- Watchers ----------
+
+
+class InotifyWatcher:
+    """Recursive watch of directories (or single files) through inotify."""
+
+    def __init__(self, roots: Iterable[Path], on_change: Callable[[Path], None]):
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify not available")
+        self._libc = libc
+        self._fd = libc.inotify_init1(IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.on_change = on_change
+        self.roots = [Path(r).resolve() for r in roots]
+        self._dirs: Dict[int, Path] = {}
+        self._files = set()  # file roots; their directory is watched
+        for root in self.roots:
+            if root.is_dir():
+                self._add_tree(root)
+            else:
+                self._files.add(root)
+                self._add(root.parent)
+
+    def _add(self, directory: Path):
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(directory)), WATCH_MASK)
+        if wd >= 0:
+            self._dirs[wd] = directory
+
+    def _add_tree(self, root: Path):
+        self._add(root)
+        for parent, dirs, _ in os.walk(root):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS]
+            for d in dirs:
+                self._add(Path(parent) / d)
+
+    def _wanted(self, path: Path) -> bool:
+        if path in self._files:
+            return True
+        return any(root == path or root in path.parents for root in self.roots if root not in self._files)
+
+    def _rescan(self):
+        for path in collect_files(str(r) for r in self.roots):
+            self.on_change(path)
+
+    def run(self, stop: threading.Event):
+        while not stop.is_set():
+            try:
+                ready, _, _ = select.select([self._fd], [], [], 1.0)
+                data = os.read(self._fd, 64 * 1024) if ready else b""
+            except OSError:
+                if stop.is_set():
+                    return  # closed on shutdown
+                raise
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = EVENT.unpack_from(data, offset)
+                raw = data[offset + EVENT.size: offset + EVENT.size + length]
+                offset += EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    self._rescan()  # events were dropped; the hash check filters the rest
+                    continue
+                directory = self._dirs.get(wd)
+                name = os.fsdecode(raw.rstrip(b"\0"))
+                if directory is None or not name or _ignored_name(name):
+                    continue
+                path = directory / name
+                if mask & IN_ISDIR:
+                    if mask & (IN_CREATE | IN_MOVED_TO) and name not in SKIP_DIRS and self._wanted(path):
+                        self._add_tree(path)
+                elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and self._wanted(path):
+                    self.on_change(path)
+
+    def close(self):
+        os.close(self._fd)
+
+
+class PollingWatcher:
+    """Fallback watcher comparing size and mtime every ``interval`` seconds."""
+
+    def __init__(self, roots: Iterable[Path], on_change: Callable[[Path], None], interval: float = POLL_INTERVAL):
+        self.roots = [str(Path(r).resolve()) for r in roots]
+        self.on_change = on_change
+        self.interval = interval
+        self._seen = self._snapshot()
+
+    def _snapshot(self) -> Dict[Path, tuple]:
+        stats = {}
+        for path in collect_files(self.roots):
+            for candidate in (path, backup_path(path)):
+                try:
+                    st = candidate.stat()
+                except OSError:
+                    continue
+                stats[candidate] = (st.st_size, st.st_mtime_ns)
+        return stats
+
+    def run(self, stop: threading.Event):
+        while not stop.wait(self.interval):
+            current = self._snapshot()
+            for path, stat in current.items():
+                if self._seen.get(path) != stat:
+                    self.on_change(path)
+            self._seen = current
+
+    def close(self):
+        pass
+
+
+def make_watcher(roots: List[Path], on_change, poll: bool = False):
+    if not poll and sys.platform.startswith("linux"):
+        try:
+            return InotifyWatcher(roots, on_change)
+        except OSError as e:
+            print(f"⚠️ inotify unavailable ({e}); polling every {POLL_INTERVAL:.0f}s")
+    return PollingWatcher(roots, on_change)
+
+
+# ---------- Daemon ----------
+
+
+class Daemon:
+    def __init__(self, options: dict, debounce: float = DEBOUNCE):
+        self.options = options
+        self.debounce = debounce
+        self.stop = threading.Event()
+        # One run at a time: output is captured by swapping sys.stdout
+        self._run_lock = threading.Lock()
+        self._due: Dict[Path, float] = {}
+        self._due_cond = threading.Condition()
+        self._hashes: Dict[Path, str] = {}
+        self.env = run_env()
+        self.requests = 0
+        self.recompressed = 0
+
+    # ----- socket requests -----
+
+    def handle(self, argv: List[str], cwd: str) -> Optional[tuple]:
+        """Run CLI ``argv`` as if started in ``cwd``; returns (exit code, output).
+
+        None if another run still holds the daemon after :data:`BUSY_WAIT`.
+        """
+        args = parse_args(argv)
+        args.targets = [os.path.join(cwd, os.path.expanduser(t)) for t in args.targets]
+        if not self._run_lock.acquire(timeout=BUSY_WAIT):
+            return None
+        out = io.StringIO()
+        code = 0
+        try:
+            with contextlib.redirect_stdout(out), contextlib.redirect_stderr(out):
+                self.requests += 1
+                _reset_counters()
+                try:
+                    run(args)
+                except SystemExit as e:
+                    code = e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+                except Exception as e:
+                    print(f"\n❌ Error: {e}")
+                    code = 1
+        finally:
+            self._run_lock.release()
+        return code, out.getvalue()
+
+    def declines(self, env: dict) -> Optional[str]:
+        """Why a client with settings ``env`` (see :func:`run_env`) must run in-process, if it must."""
+        differ = sorted(k for k in set(env) | set(self.env) if env.get(k) != self.env.get(k))
+        return f"settings differ: {', '.join(differ)}" if differ else None
+
+    def status(self) -> dict:
+        with self._due_cond:
+            pending = len(self._due)
+        return {"pid": os.getpid(), "requests": self.requests, "recompressed": self.recompressed, "pending": pending}
+
+    # ----- watching -----
+
+    def changed(self, path: Path):
+        """Watcher callback: (re)schedule ``path``'s file after the debounce delay."""
+        if path.name.endswith(".original.md"):
+            paths = compressed_paths(path)
+        elif _is_candidate(path):
+            paths = [path]
+        else:
+            return
+        with self._due_cond:
+            for p in paths:
+                self._due[p] = time.monotonic() + self.debounce
+            self._due_cond.notify()
+
+    def _source_hash(self, path: Path) -> Optional[str]:
+        backup = backup_path(path)
+        try:
+            return sha256_text((backup if backup.exists() else path).read_text(errors="ignore"))
+        except OSError:
+            return None
+
+    def _debounce_loop(self):
+        while not self.stop.is_set():
+            with self._due_cond:
+                now = time.monotonic()
+                ready = [p for p, t in self._due.items() if t <= now]
+                for p in ready:
+                    del self._due[p]
+                if not ready:
+                    wait = min(self._due.values(), default=now + 1.0) - now
+                    self._due_cond.wait(max(0.01, min(wait, 1.0)))
+                    continue
+            self.recompress(ready)
+
+    def recompress(self, paths: List[Path]):
+        """Compress the files among ``paths`` whose source text changed since last time."""
+        changed = []
+        for path in paths:
+            digest = self._source_hash(path)
+            if digest is not None and self._hashes.get(path) != digest:
+                changed.append(path)
+        if not changed:
+            return
+        with self._run_lock:
+            _reset_counters()
+            results = run_batch([str(p) for p in changed], **self.options)
+            stamp = time.strftime("%H:%M:%S")
+            for r in results:
+                # Hash after the run: our own writes then look unchanged
+                self._hashes[r.path] = self._source_hash(r.path)
+                if r.status == "compressed":
+                    self.recompressed += 1
+                print(f"[{stamp}] {r.path}: {r.status}{' (' + r.detail + ')' if r.detail else ''}", flush=True)
+
+    def watch(self, roots: List[Path], poll: bool = False):
+        # Only edits made from now on trigger a run
+        for path in collect_files(str(r) for r in roots):
+            self._hashes[path] = self._source_hash(path)
+        watcher = make_watcher(roots, self.changed, poll)
+        threading.Thread(target=watcher.run, args=(self.stop,), daemon=True, name="caveman-watch").start()
+        threading.Thread(target=self._debounce_loop, daemon=True, name="caveman-debounce").start()
+        kind = "inotify" if isinstance(watcher, InotifyWatcher) else "polling"
+        print(f"Watching {len(roots)} path(s) ({kind}, {self.debounce:g}s debounce)", flush=True)
+        return watcher
+
+
+def _reset_counters():
+    # Cache and usage reports describe the current run, not the daemon's lifetime
+    get_usage().reset()
+    reset_cache_stats()
+
+
+# ---------- Server ----------
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self):
+        daemon: Daemon = self.server.daemon
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        cmd = request.get("cmd")
+        if cmd == "run" and daemon.declines(request.get("env") or {}):
+            reply = {"declined": daemon.declines(request.get("env") or {})}
+        elif cmd == "run":
+            result = daemon.handle(request.get("argv", []), request.get("cwd") or os.getcwd())
+            reply = {"declined": "busy"} if result is None else {"code": result[0], "output": result[1]}
+        elif cmd == "status":
+            reply = daemon.status()
+        elif cmd == "stop":
+            reply = {"stopping": True}
+        else:
+            reply = {"error": f"unknown command: {cmd!r}"}
+        self.wfile.write((json.dumps(reply) + "\n").encode())
+        self.wfile.flush()
+        if cmd == "stop":
+            # Reply first: the process exits as soon as serve_forever returns
+            threading.Thread(target=self.server.shutdown, daemon=True).start()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def bind(path: Path) -> _Server:
+    """Create the server socket at ``path``, readable by this user only."""
+    if path.exists():
+        if request_daemon({"cmd": "status"}) is not None:
+            raise SystemExit(f"❌ A daemon is already listening on {path}")
+        path.unlink()  # left behind by a daemon that died
+    path.parent.mkdir(parents=True, exist_ok=True, mode=0o700)
+    # The socket is created with these permissions; no window before a chmod.
+    # Bound before any other thread starts, as the umask is process-wide.
+    umask = os.umask(0o077)
+    try:
+        return _Server(str(path), _Handler)
+    finally:
+        os.umask(umask)
+
+
+def serve(daemon: Daemon, server: _Server, path: Path):
+    """Serve ``daemon`` on ``server`` (bound at ``path``) until stopped."""
+    server.daemon = daemon
+    print(f"Listening on {path} (pid {os.getpid()})", flush=True)
+    server.serve_forever()
+
+
+# ---------- CLI ----------
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="caveman-daemon")
+    parser.add_argument("watch", nargs="*", help="files or directories to recompress on change")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--local", action="store_true", help="watched files: lexical rules only")
+    mode.add_argument("--precompress", action="store_true", help="watched files: lexical rules before the model")
+    parser.add_argument("--budget", type=int, default=None, help="watched files: token budget (see the CLI)")
+    parser.add_argument("--debounce", type=float, default=DEBOUNCE, help="seconds of quiet before recompressing")
+    parser.add_argument("--poll", action="store_true", help="poll instead of using inotify")
+    parser.add_argument("--status", action="store_true", help="print the running daemon's status")
+    parser.add_argument("--stop", action="store_true", help="stop the running daemon")
+    args = parser.parse_args(argv)
+
+    if args.status or args.stop:
+        reply = request_daemon({"cmd": "stop" if args.stop else "status"})
+        if reply is None:
+            print(f"No daemon listening on {socket_path()}")
+            sys.exit(1)
+        print(json.dumps(reply))
+        return
+
+    if not hasattr(socket, "AF_UNIX"):
+        raise SystemExit("❌ The daemon needs Unix domain sockets")
+
+    # Exit through the finally blocks so the socket is removed
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    options = {"local": args.local, "precompress": args.precompress, "budget": args.budget}
+    daemon = Daemon(options, debounce=args.debounce)
+    path = socket_path()
+    server = bind(path)
+    watcher = None
+    try:
+        if args.watch:
+            watcher = daemon.watch([Path(p) for p in args.watch], poll=args.poll)
+        serve(daemon, server, path)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        daemon.stop.set()
+        server.server_close()
+        path.unlink(missing_ok=True)
+        if watcher is not None:
+            watcher.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,10 @@
 """Detect whether a file is natural language (compressible) or code/config (skip)."""
 
 import json
+import os
 import re
 from pathlib import Path
+from typing import List, Optional
 
 # Extensions that are natural language and compressible
 COMPRESSIBLE_EXTENSIONS = {".md", ".txt", ".markdown", ".rst"}
@@ -17,25 +19,174 @@ SKIP_EXTENSIONS = {
     ".dockerfile", ".makefile", ".csv", ".ini", ".cfg",
 }
 
-# Patterns that indicate a line is code
-CODE_PATTERNS = [
-    re.compile(r"^\s*(import |from .+ import |require\(|const |let |var )"),
-    re.compile(r"^\s*(def |class |function |async function |export )"),
-    re.compile(r"^\s*(if\s*\(|for\s*\(|while\s*\(|switch\s*\(|try\s*\{)"),
-    re.compile(r"^\s*[\}\]\);]+\s*$"),  # closing braces/brackets
-    re.compile(r"^\s*@\w+"),  # decorators/annotations
-    re.compile(r'^\s*"[^"]+"\s*:\s*'),  # JSON-like key-value
-    re.compile(r"^\s*\w+\s*=\s*[{\[\(\"']"),  # assignment with literal
-]
+# Only this much of a file is read to classify it.
+PREFIX_BYTES = 16_384
 
+# Signatures of common binary formats.
+BINARY_MAGIC = (
+    b"\x7fELF", b"%PDF", b"\x89PNG", b"GIF8", b"\xff\xd8\xff", b"PK\x03\x04",
+    b"\x1f\x8b", b"BZh", b"\xfd7zXZ", b"7z\xbc\xaf", b"SQLite format 3", b"\xca\xfe\xba\xbe",
+)
 
-def _is_code_line(line: str) -> bool:
-    """Check if a line looks like code."""
-    return any(p.match(line) for p in CODE_PATTERNS)
+# Bytes that occur in text (printable, whitespace, backspace, escape, high bytes).
+TEXT_BYTES = bytes({7, 8, 9, 10, 12, 13, 27} | set(range(0x20, 0x100)) - {0x7F})
+
+# Patterns that indicate a line is code, as one alternation so each line
+# costs a single match call
+CODE_LINE_REGEX = re.compile(
+    r"""^\s*(?:
+        import\ |from\ .+\ import\ |require\(|const\ |let\ |var\ 
+      | def\ |class\ |function\ |async\ function\ |export\ 
+      | if\s*\(|for\s*\(|while\s*\(|switch\s*\(|try\s*\{
+      | [}\]);]+\s*$                 # closing braces/brackets
+      | @\w+                         # decorators/annotations
+      | "[^"]+"\s*:\s*               # JSON-like key-value
+      | \w+\s*=\s*[{\[("']           # assignment with literal
+    )""",
+    re.VERBOSE,
+)
+
+# YAML-looking lines (matched against the stripped line)
+YAML_KEY_REGEX = re.compile(r"\w[\w\s]*:\s")
+
+# Lines sampled for the code and YAML heuristics, and their thresholds
+CODE_SAMPLE_LINES = 50
+YAML_SAMPLE_LINES = 30
+CODE_THRESHOLD = 0.4
+YAML_THRESHOLD = 0.6
+
+# Non-empty lines needed before a content verdict gets full confidence
+CONFIDENT_SAMPLE = 10
+
+# First characters a JSON document can start with
+JSON_START = frozenset('{["-0123456789tfn')
+
+CONFIG_EXTENSIONS = {".json", ".yaml", ".yml", ".toml", ".ini", ".cfg", ".env"}
+
+
+class FileProbe:
+    """Bounded view of a file, shared by detection and compression.
+
+    Detection only ever sees ``head`` (the first ``PREFIX_BYTES``); files
+    that fit in it are read in full by that one read, so :meth:`text` can
+    hand the same bytes to the compressor without touching the disk again.
+    """
+
+    def __init__(self, filepath: Path, limit: int = PREFIX_BYTES):
+        self.path = Path(filepath)
+        self.limit = limit
+        self._head = None
+        self._complete = False
+        self._stat = None  # (size, mtime_ns) when head was read
+
+    @property
+    def head(self) -> bytes:
+        if self._head is None:
+            with open(self.path, "rb") as f:
+                st = os.fstat(f.fileno())
+                self._head = f.read(self.limit)
+                self._complete = st.st_size <= self.limit
+                self._stat = (st.st_size, st.st_mtime_ns)
+        return self._head
+
+    def refresh(self) -> bool:
+        """Drop the cached read if the file changed since; True if it did.
+
+        Batch jobs wait in a queue after planning, so they call this before
+        reusing the probe to pick up edits made in the meantime.
+        """
+        if self._head is None:
+            return False
+        try:
+            st = self.path.stat()
+            current = (st.st_size, st.st_mtime_ns)
+        except OSError:
+            current = None
+        if current == self._stat:
+            return False
+        self._head = None
+        self._complete = False
+        self._stat = None
+        return True
+
+    @property
+    def is_binary(self) -> bool:
+        return is_binary(self.head)
+
+    def text(self) -> str:
+        """The whole file, decoded like ``read_text(errors="ignore")``."""
+        head = self.head  # sets _complete
+        data = head if self._complete else self.path.read_bytes()
+        return _decode(data)
+
+    def head_text(self) -> str:
+        return _decode(self.head)
+
+
+def _decode(data: bytes) -> str:
+    # read_text uses universal newlines; hashes and fingerprints must match it
+    return data.decode("utf-8", errors="ignore").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def is_binary(head: bytes) -> bool:
+    """Sniff raw bytes: known magic numbers, NUL bytes, or mostly control bytes."""
+    if not head:
+        return False
+    if head.startswith(BINARY_MAGIC) or b"\x00" in head:
+        return True
+    return len(head.translate(None, TEXT_BYTES)) / len(head) > 0.3
+
+
+class Classification:
+    """A file type label with a confidence in [0, 1] and the per-label scores behind it."""
+
+    __slots__ = ("label", "confidence", "scores")
+
+    def __init__(self, label: str, confidence: float, scores: Optional[dict] = None):
+        self.label = label
+        self.confidence = confidence
+        self.scores = scores or {label: confidence}
+
+    def __repr__(self):
+        return f"Classification({self.label!r}, confidence={self.confidence:.2f})"
+
+
+class LineStats:
+    """Line counts for the code and YAML heuristics, gathered in one pass."""
+
+    __slots__ = ("non_empty", "code", "yaml_non_empty", "yaml")
+
+    def __init__(self, lines: List[str]):
+        self.non_empty = self.code = self.yaml_non_empty = self.yaml = 0
+        for i, line in enumerate(lines[:CODE_SAMPLE_LINES]):
+            stripped = line.strip()
+            if not stripped:
+                continue
+            self.non_empty += 1
+            if CODE_LINE_REGEX.match(line):
+                self.code += 1
+            if i < YAML_SAMPLE_LINES:
+                self.yaml_non_empty += 1
+                if (
+                    stripped.startswith("---")
+                    or YAML_KEY_REGEX.match(stripped)
+                    or (stripped.startswith("- ") and ":" in stripped)
+                ):
+                    self.yaml += 1
+
+    @property
+    def code_ratio(self) -> float:
+        return self.code / self.non_empty if self.non_empty else 0.0
+
+    @property
+    def yaml_ratio(self) -> float:
+        return self.yaml / self.yaml_non_empty if self.yaml_non_empty else 0.0
 
 
 def _is_json_content(text: str) -> bool:
     """Check if content is valid JSON."""
+    if text.lstrip()[:1] not in JSON_START:
+        return False
     try:
         json.loads(text)
         return True
@@ -43,68 +194,87 @@ def _is_json_content(text: str) -> bool:
         return False
 
 
-def _is_yaml_content(lines: list[str]) -> bool:
-    """Heuristic: check if content looks like YAML."""
-    yaml_indicators = 0
-    for line in lines[:30]:
-        stripped = line.strip()
-        if stripped.startswith("---"):
-            yaml_indicators += 1
-        elif re.match(r"^\w[\w\s]*:\s", stripped):
-            yaml_indicators += 1
-        elif stripped.startswith("- ") and ":" in stripped:
-            yaml_indicators += 1
-    # If most non-empty lines look like YAML
-    non_empty = sum(1 for l in lines[:30] if l.strip())
-    return non_empty > 0 and yaml_indicators / non_empty > 0.6
+def _margin(ratio: float, threshold: float, above: bool) -> float:
+    """Distance of ``ratio`` past ``threshold``, scaled to [0, 1]."""
+    if above:
+        return (ratio - threshold) / (1.0 - threshold)
+    return (threshold - ratio) / threshold
 
 
-def detect_file_type(filepath: Path) -> str:
-    """Classify a file as 'natural_language', 'code', 'config', or 'unknown'.
+def classify_text(text: str) -> Classification:
+    """Score content as config, code or natural language.
 
-    Returns:
-        One of: 'natural_language', 'code', 'config', 'unknown'
+    Labels follow the JSON/YAML/code-ratio heuristics; confidence grows
+    with how far the deciding ratio clears its threshold and with the
+    number of lines sampled.
+    """
+    if _is_json_content(text[:10000]):
+        return Classification("config", 1.0)
+
+    stats = LineStats(text.splitlines()[:CODE_SAMPLE_LINES])
+    if not stats.non_empty:
+        return Classification("natural_language", 0.5)
+    code, yaml = stats.code_ratio, stats.yaml_ratio
+    scores = {"config": yaml, "code": code, "natural_language": 1.0 - max(code, yaml)}
+    if yaml > YAML_THRESHOLD:
+        label, margin = "config", _margin(yaml, YAML_THRESHOLD, True)
+    elif code > CODE_THRESHOLD:
+        label, margin = "code", _margin(code, CODE_THRESHOLD, True)
+    else:
+        label = "natural_language"
+        margin = min(_margin(code, CODE_THRESHOLD, False), _margin(yaml, YAML_THRESHOLD, False))
+    sample = min(1.0, stats.non_empty / CONFIDENT_SAMPLE)
+    return Classification(label, 0.5 + 0.5 * margin * sample, scores)
+
+
+def classify(filepath: Path, probe: Optional[FileProbe] = None) -> Classification:
+    """Classify a file as 'natural_language', 'code', 'config', 'binary' or 'unknown'.
+
+    Extensions decide outright (confidence 1.0). Compressible and
+    extensionless files are sniffed for binary content through ``probe``
+    (one is made if not given; pass it on to reuse the read), and
+    extensionless text is scored by :func:`classify_text` over the first
+    ``PREFIX_BYTES``.
     """
     ext = filepath.suffix.lower()
 
-    # Extension-based classification
-    if ext in COMPRESSIBLE_EXTENSIONS:
-        return "natural_language"
     if ext in SKIP_EXTENSIONS:
-        return "code" if ext not in {".json", ".yaml", ".yml", ".toml", ".ini", ".cfg", ".env"} else "config"
+        return Classification("config" if ext in CONFIG_EXTENSIONS else "code", 1.0)
+    if ext not in COMPRESSIBLE_EXTENSIONS and ext:
+        return Classification("unknown", 1.0)
 
-    # Extensionless files (like CLAUDE.md, TODO) — check content
-    if not ext:
-        try:
-            text = filepath.read_text(errors="ignore")
-        except (OSError, PermissionError):
-            return "unknown"
+    probe = probe or FileProbe(filepath)
+    try:
+        if probe.is_binary:
+            return Classification("binary", 1.0)
+    except OSError:
+        return Classification("unknown", 1.0)
 
-        lines = text.splitlines()[:50]
+    # Extension-based classification
+    if ext in COMPRESSIBLE_EXTENSIONS:
+        return Classification("natural_language", 1.0)
 
-        if _is_json_content(text[:10000]):
-            return "config"
-        if _is_yaml_content(lines):
-            return "config"
+    # Extensionless files (like CLAUDE.md, TODO) — score the prefix
+    return classify_text(probe.head_text())
 
-        code_lines = sum(1 for l in lines if l.strip() and _is_code_line(l))
-        non_empty = sum(1 for l in lines if l.strip())
-        if non_empty > 0 and code_lines / non_empty > 0.4:
-            return "code"
 
-        return "natural_language"
+def detect_file_type(filepath: Path, probe: Optional[FileProbe] = None) -> str:
+    """Classify a file as 'natural_language', 'code', 'config', 'binary', or 'unknown'.
 
-    return "unknown"
+    Returns:
+        One of: 'natural_language', 'code', 'config', 'binary', 'unknown'
+    """
+    return classify(filepath, probe).label
 
 
-def should_compress(filepath: Path) -> bool:
+def should_compress(filepath: Path, probe: Optional[FileProbe] = None) -> bool:
     """Return True if the file is natural language and should be compressed."""
     if not filepath.is_file():
         return False
     # Skip backup files
     if filepath.name.endswith(".original.md"):
         return False
-    return detect_file_type(filepath) == "natural_language"
+    return detect_file_type(filepath, probe) == "natural_language"
 
 
 if __name__ == "__main__":
@@ -116,6 +286,7 @@ if __name__ == "__main__":
 
     for path_str in sys.argv[1:]:
         p = Path(path_str).resolve()
-        file_type = detect_file_type(p)
-        compress = should_compress(p)
-        print(f"  {p.name:30s} type={file_type:20s} compress={compress}")
+        probe = FileProbe(p)
+        result = classify(p, probe)
+        compress = should_compress(p, probe)
+        print(f"  {p.name:30s} type={result.label:20s} confidence={result.confidence:.2f} compress={compress}")
@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+"""Crash-safe file writes.
+
+Text is written to a temp file in the target's directory, fsynced and
+renamed over the target, so a reader (or a run after a crash) sees either
+the old content or the new content, never a truncated file.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+
+# Read once: os.umask can only be queried by setting it, which is not
+# safe to do while other threads create files.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+
+def fsync_dir(directory: Path):
+    """Persist a rename in ``directory`` (no-op where directories cannot be opened)."""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def atomic_write_text(path: Path, text: str, durable: bool = True):
+    """Replace ``path`` with ``text`` atomically, keeping its permissions.
+
+    With ``durable`` the data and the rename are fsynced before returning.
+    """
+    path = Path(path)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8", errors="surrogateescape") as f:
+            f.write(text)
+            f.flush()
+            if durable:
+                os.fsync(f.fileno())
+        try:
+            os.chmod(tmp, path.stat().st_mode & 0o7777)
+        except OSError:
+            os.chmod(tmp, 0o666 & ~_UMASK)
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    if durable:
+        fsync_dir(path.parent)
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""Repository-wide record of compressed files in ``.caveman/manifest.json``.
+
+One entry per compressed file (keyed by its path relative to the repo
+root) holds the original and output hashes, model, mode, prompt version,
+token counts, status and the size/mtime of both files when they were
+written. Staleness checks compare size and mtime first and only hash a
+file when those changed, so "what needs recompressing" stays cheap on
+large trees. The per-file sidecar remains the source of section hashes.
+"""
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+from .fileio import atomic_write_text
+from .sidecar import sha256_text
+
+INDEX_DIR = ".caveman"
+INDEX_NAME = "manifest.json"
+INDEX_VERSION = 1
+
+# Markers of a repository root, nearest first.
+ROOT_MARKERS = (INDEX_DIR, ".git", ".hg")
+
+# Index statuses, from "nothing to do" to "needs attention".
+CURRENT = "current"          # both files match the recorded hashes
+STALE = "stale"              # FILE.original.md changed since compression
+OUTDATED = "outdated"        # compressed with another model, mode or prompt
+EDITED = "edited"            # FILE.md was edited by hand since compression
+FAILED = "failed"            # last run failed validation
+MISSING = "missing"          # FILE.md or its backup is gone
+UNTRACKED = "untracked"      # no entry
+
+
+def index_enabled() -> bool:
+    return os.environ.get("CAVEMAN_INDEX", "1").lower() not in ("0", "false", "no", "off")
+
+
+def find_root(path: Path) -> Path:
+    """Nearest ancestor of ``path`` holding ``.caveman``, ``.git`` or ``.hg``; else its directory."""
+    path = path.resolve()
+    start = path if path.is_dir() else path.parent
+    for directory in (start, *start.parents):
+        if any((directory / marker).exists() for marker in ROOT_MARKERS):
+            return directory
+    return start
+
+
+def file_stat(path: Path) -> Optional[List[int]]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def backup_path(path: Path) -> Path:
+    return path.with_name(path.stem + ".original.md")
+
+
+class Index:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.path = self.root / INDEX_DIR / INDEX_NAME
+        self._lock = threading.Lock()
+        self._data = None
+        self._data_stat = None
+
+    # ---------- Storage ----------
+
+    def _read(self) -> dict:
+        try:
+            data = json.loads(self.path.read_text())
+        except (OSError, ValueError):
+            data = None
+        if not isinstance(data, dict) or not isinstance(data.get("files"), dict):
+            data = {"version": INDEX_VERSION, "files": {}}
+        return data
+
+    def _load(self) -> dict:
+        """Parsed manifest, re-read only when the file changed on disk."""
+        current = file_stat(self.path)
+        if self._data is None or current != self._data_stat:
+            self._data = self._read()
+            self._data_stat = current
+        return self._data
+
+    def _write(self, data: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        atomic_write_text(self.path, json.dumps(data, indent=1, sort_keys=True) + "\n", durable=False)
+        self._data = data
+        self._data_stat = file_stat(self.path)
+
+    def key(self, path: Path) -> str:
+        path = path.resolve()
+        try:
+            return path.relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            return path.as_posix()
+
+    # ---------- Entries ----------
+
+    def get(self, path: Path) -> Optional[dict]:
+        with self._lock:
+            entry = self._load()["files"].get(self.key(path))
+        return dict(entry) if entry else None
+
+    def entries(self) -> Dict[str, dict]:
+        with self._lock:
+            return {k: dict(v) for k, v in self._load()["files"].items()}
+
+    def _modify(self, path: Path, fn) -> Optional[dict]:
+        """Apply ``fn(files, key)`` to a fresh read of the manifest and write it back.
+
+        Read-modify-write runs under a thread lock and, where available, an
+        flock so concurrent runs on one repo do not lose each other's entries.
+        """
+        key = self.key(path)
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path.parent / (INDEX_NAME + ".lock"), "w") as lock:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                data = self._read()
+                fn(data["files"], key)
+                self._write(data)
+                entry = data["files"].get(key)
+        return dict(entry) if entry else None
+
+    def update(self, path: Path, **fields) -> dict:
+        """Merge ``fields`` into the entry for ``path``."""
+
+        def merge(files, key):
+            entry = files.setdefault(key, {})
+            entry.update(fields)
+            entry["updated"] = time.strftime("%Y-%m-%dT%H:%M:%S%z")
+
+        return self._modify(path, merge)
+
+    def replace(self, path: Path, entry: Optional[dict]):
+        """Set the whole entry for ``path``; None removes it."""
+
+        def put(files, key):
+            if entry is None:
+                files.pop(key, None)
+            else:
+                files[key] = dict(entry)
+
+        self._modify(path, put)
+
+    def record(self, path: Path, **fields) -> dict:
+        """Record ``path`` and its backup as just written, with their stats."""
+        return self.update(
+            path,
+            output_stat=file_stat(path),
+            source_stat=file_stat(backup_path(path)),
+            **fields,
+        )
+
+    # ---------- Staleness ----------
+
+    def status(
+        self,
+        path: Path,
+        mode: Optional[str] = None,
+        model: Optional[str] = None,
+        prompt_version: Optional[str] = None,
+    ) -> str:
+        """Where ``path`` stands against its entry; see the status constants.
+
+        Size and mtime are compared first; a file is hashed only when they
+        differ from what was recorded. ``mode``/``model``/``prompt_version``
+        mark entries made under other settings as outdated (model and
+        prompt only matter outside local mode).
+        """
+        entry = self.get(path)
+        if not entry:
+            return UNTRACKED
+        if entry.get("status") == FAILED:
+            return FAILED
+        backup = backup_path(path)
+        if not path.exists() or not backup.exists():
+            return MISSING
+        if not _matches(path, entry.get("output_stat"), entry.get("output_sha256")):
+            return EDITED
+        if not _matches(backup, entry.get("source_stat"), entry.get("original_sha256")):
+            return STALE
+        if mode is not None and entry.get("mode", "model") != mode:
+            return OUTDATED
+        if (mode or entry.get("mode", "model")) != "local" and (
+            (model is not None and entry.get("model") != model)
+            or (prompt_version is not None and entry.get("prompt_version") != prompt_version)
+        ):
+            return OUTDATED
+        return CURRENT
+
+    def stale(self, **settings) -> List[Tuple[str, str]]:
+        """``(key, status)`` for every entry that is not current."""
+        out = []
+        for key in sorted(self.entries()):
+            path = Path(key) if Path(key).is_absolute() else self.root / key
+            state = self.status(path, **settings)
+            if state != CURRENT:
+                out.append((key, state))
+        return out
+
+
+def _matches(path: Path, stat: Optional[List[int]], digest: Optional[str]) -> bool:
+    if stat is not None and file_stat(path) == list(stat):
+        return True
+    if not digest:
+        return False
+    try:
+        return sha256_text(path.read_text(errors="ignore")) == digest
+    except OSError:
+        return False
+
+
+_indexes: Dict[Path, Index] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_index(path: Path) -> Optional[Index]:
+    """Shared :class:`Index` for the repo containing ``path``; None if CAVEMAN_INDEX=0."""
+    if not index_enabled():
+        return None
+    root = find_root(path)
+    with _indexes_lock:
+        if root not in _indexes:
+            _indexes[root] = Index(root)
+        return _indexes[root]
+
+
+def print_index(index: Index, keys: Optional[Iterable[str]] = None, statuses: Optional[dict] = None):
+    entries = index.entries()
+    keys = sorted(entries) if keys is None else list(keys)
+    print("\n| File | Status | Tokens | Saved % | Model | Updated |")
+    print("|------|--------|--------|---------|-------|---------|")
+    for key in keys:
+        e = entries.get(key, {})
+        before, after = e.get("original_tokens"), e.get("compressed_tokens")
+        tokens = f"{before} -> {after}" if before is not None else "-"
+        saved = f"{100 * (before - after) / before:.1f}%" if before else "-"
+        state = (statuses or {}).get(key, e.get("status", "-"))
+        print(f"| {key} | {state} | {tokens} | {saved} | {e.get('model') or e.get('mode', '-')} | {e.get('updated', '-')} |")
+    print(f"\n{len(keys)} file(s) in {index.path}")
+
+
+# ---------- CLI ----------
+
+if __name__ == "__main__":
+    import sys
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    idx = Index(find_root(Path(args[0]) if args else Path.cwd()))
+    if "--stale" in sys.argv:
+        found = idx.stale()
+        print_index(idx, [k for k, _ in found], dict(found))
+    else:
+        print_index(idx)
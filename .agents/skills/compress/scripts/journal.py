@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""Write-ahead journal for the backup/compressed-file swap.
+
+Before a validated result is written, a ``begin`` record with everything
+needed to finish or undo the swap is appended (and fsynced) to
+``.caveman/journal.jsonl``; ``commit`` is appended once the backup, the
+compressed file, the sidecar and the index entry are all in place. A run
+that dies in between leaves a pending record, which :func:`recover`
+resolves:
+
+* the compressed file landed: roll forward (sidecar + index written),
+  or with ``rollback`` put back the previous file, sidecar and entry;
+* it did not land: remove the backup this run created, so the next run
+  starts clean instead of refusing on an orphaned backup.
+
+The journal is truncated whenever no transaction is pending.
+"""
+
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: in-process locking only
+    fcntl = None
+
+from .fileio import atomic_write_text
+from .index import INDEX_DIR, backup_path, find_root, get_index
+from .sidecar import load_sidecar, save_sidecar, sha256_text, write_sidecar
+
+JOURNAL_NAME = "journal.jsonl"
+
+
+def _alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, owned by someone else
+    return True
+
+
+def _file_sha256(path: Path) -> Optional[str]:
+    try:
+        return sha256_text(path.read_text(errors="ignore"))
+    except OSError:
+        return None
+
+
+class Journal:
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.path = self.root / INDEX_DIR / JOURNAL_NAME
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _locked(self):
+        """Thread lock plus, where available, an flock shared with other runs.
+
+        Without it one run could truncate the journal between another run's
+        read and append, dropping that run's pending ``begin`` record.
+        """
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path.parent / (JOURNAL_NAME + ".lock"), "w") as lock:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                yield
+
+    def _append(self, record: dict):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        line = json.dumps(record, sort_keys=True) + "\n"
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(line)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _records(self) -> List[dict]:
+        try:
+            lines = self.path.read_text(encoding="utf-8").splitlines()
+        except OSError:
+            return []
+        records = []
+        for line in lines:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue  # torn final line from a crash mid-append
+        return records
+
+    def _pending_locked(self) -> Dict[str, dict]:
+        open_txns: Dict[str, dict] = {}
+        for record in self._records():
+            if record.get("op") == "begin":
+                open_txns[record["txid"]] = record
+            else:
+                open_txns.pop(record.get("txid"), None)
+        return open_txns
+
+    def pending(self, path: Optional[Path] = None) -> List[dict]:
+        """Unfinished transactions (for ``path`` only, if given)."""
+        if not self.path.exists():
+            return []
+        with self._locked():
+            txns = list(self._pending_locked().values())
+        if path is not None:
+            target = str(Path(path).resolve())
+            txns = [t for t in txns if t["path"] == target]
+        return txns
+
+    def begin(self, path: Path, **payload) -> str:
+        txid = uuid.uuid4().hex
+        with self._locked():
+            self._append({
+                "op": "begin",
+                "txid": txid,
+                "path": str(Path(path).resolve()),
+                "pid": os.getpid(),
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+                **payload,
+            })
+        return txid
+
+    def end(self, txid: str, op: str = "commit"):
+        """Close ``txid`` (``commit`` or ``abort``); truncate once nothing is pending."""
+        with self._locked():
+            self._append({"op": op, "txid": txid})
+            if not self._pending_locked():
+                self.path.unlink(missing_ok=True)
+
+
+_journals: Dict[Path, Journal] = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal(path: Path) -> Journal:
+    """Shared :class:`Journal` for the repo containing ``path``."""
+    root = find_root(path)
+    with _journals_lock:
+        if root not in _journals:
+            _journals[root] = Journal(root)
+        return _journals[root]
+
+
+# ---------- Transactions ----------
+
+
+def apply_metadata(path: Path, txn: dict):
+    """Write the sidecar and index entry recorded in ``txn``."""
+    save_sidecar(path, **txn["sidecar"])
+    index = get_index(path)
+    if index is not None and txn.get("index") is not None:
+        index.record(path, **txn["index"])
+
+
+def swap_in(
+    path: Path,
+    original_text: str,
+    compressed: str,
+    created_backup: bool,
+    previous_output: str,
+    sidecar: dict,
+    index_fields: Optional[dict],
+):
+    """Atomically install ``compressed`` (and a new backup) under the journal.
+
+    If a write fails, whatever landed is undone and the transaction aborted
+    before the error propagates: left pending under this (live) pid, a
+    long-lived process would never recover it.
+    """
+    path = Path(path).resolve()
+    index = get_index(path)
+    journal = get_journal(path)
+    txn = dict(
+        created_backup=created_backup,
+        original_sha256=sha256_text(original_text),
+        output_sha256=sha256_text(compressed),
+        # Enough to undo an update whose output already landed
+        previous_output=None if created_backup else previous_output,
+        previous_sidecar=load_sidecar(path) or None,
+        previous_index=index.get(path) if index is not None else None,
+        sidecar=sidecar,
+        index=index_fields,
+    )
+    txid = journal.begin(path, **txn)
+    try:
+        if created_backup:
+            atomic_write_text(backup_path(path), original_text)
+        atomic_write_text(path, compressed)
+        apply_metadata(path, txn)
+    except BaseException:
+        try:
+            _resolve({"path": str(path), **txn}, rollback=True)
+        finally:
+            journal.end(txid, "abort")
+        raise
+    journal.end(txid)
+
+
+def _resolve(txn: dict, rollback: bool) -> str:
+    path = Path(txn["path"])
+    backup = backup_path(path)
+    landed = _file_sha256(path) == txn["output_sha256"]
+    backup_ours = txn["created_backup"] and _file_sha256(backup) == txn["original_sha256"]
+
+    if landed and not rollback:
+        apply_metadata(path, txn)
+        return "completed"
+
+    if landed:
+        previous = backup.read_text(errors="ignore") if backup_ours else txn.get("previous_output")
+        if previous is None:
+            return "left as is (previous content unavailable)"
+        atomic_write_text(path, previous)
+        write_sidecar(path, txn.get("previous_sidecar"))
+        index = get_index(path)
+        if index is not None:
+            index.replace(path, txn.get("previous_index"))
+    if backup_ours:
+        backup.unlink()
+        return "rolled back"
+    return "rolled back" if landed else "nothing to undo"
+
+
+def recover(paths: Iterable[Path], rollback: bool = False) -> List[tuple]:
+    """Resolve unfinished transactions in the repos holding ``paths``.
+
+    Returns ``(path, outcome)`` per transaction. Transactions of live
+    processes (including this one) are left alone.
+    """
+    outcomes = []
+    seen = set()
+    dirs = (p if p.is_dir() else p.parent for p in (Path(p).resolve() for p in paths))
+    for directory in dict.fromkeys(dirs):
+        journal = get_journal(directory)
+        if journal.root in seen:
+            continue
+        seen.add(journal.root)
+        for txn in journal.pending():
+            if _alive(txn.get("pid")):
+                continue
+            outcomes.append((txn["path"], _resolve(txn, rollback)))
+            journal.end(txn["txid"], "abort" if rollback else "commit")
+    return outcomes
+
+
+def recover_file(path: Path) -> Optional[str]:
+    """Roll forward or clean up an unfinished transaction for ``path`` alone."""
+    journal = get_journal(path)
+    if not journal.path.exists():
+        return None
+    outcome = None
+    for txn in journal.pending(path):
+        if _alive(txn.get("pid")):
+            continue
+        outcome = _resolve(txn, rollback=False)
+        journal.end(txn["txid"])
+    return outcome
+
+
+# ---------- CLI ----------
+
+if __name__ == "__main__":
+    import sys
+
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    target = Path(args[0]) if args else Path.cwd()
+    results = recover([target], rollback="--rollback" in sys.argv)
+    if not results:
+        print(f"Nothing to recover in {get_journal(target).path}")
+    for path, outcome in results:
+        print(f"  {path}: {outcome}")
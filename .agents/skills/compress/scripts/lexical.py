@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""Deterministic local pass applying the lexical "Remove" rules from SKILL.md.
+
+Drops articles, filler, pleasantries, hedging and connective fluff and
+shortens redundant phrasing without a model call. Fenced and indented
+code, headings, frontmatter, inline code, URLs, link targets and paths
+are left byte-for-byte intact. Usable on its own (``--local``) or to
+shrink the text sent to the model (``--precompress``).
+"""
+
+import re
+import sys
+from pathlib import Path
+from typing import List
+
+# Support both direct execution and module import
+try:
+    from .validate import FENCE_OPEN_REGEX, PATH_REGEX, URL_REGEX
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).parent))
+    from validate import FENCE_OPEN_REGEX, PATH_REGEX, URL_REGEX
+
+# Spans that must never be rewritten inside a prose line.
+PROTECTED_REGEX = re.compile(
+    r"`+[^`]*`+"  # inline code
+    r"|\]\([^)]*\)"  # markdown link target
+    rf"|{URL_REGEX.pattern}"
+    rf"|{PATH_REGEX.pattern}"
+    r"|\$\{?\w+\}?"  # environment variables
+)
+
+# Start of a sentence within a prose segment.
+SENTENCE_START = r"(?:^|(?<=[.!?] ))"
+SENTENCE_END_REGEX = re.compile(r"[.!?][\"')\]]*\s+$")
+
+# Left where a capitalized sentence-leading word was deleted; the next
+# letter is capitalized in its place.
+RECAP = "\x00"
+RECAP_REGEX = re.compile(RECAP + r"[\s,]*([a-z]?)")
+
+
+def _delete(m: "re.Match") -> str:
+    """Drop the match; at a capitalized sentence start, mark for recapitalization."""
+    leading = m.start() == 0 or SENTENCE_END_REGEX.search(m.string, 0, m.start())
+    return RECAP if leading and m.group(0)[:1].isupper() else ""
+
+
+# (pattern, replacement) applied in order, case-insensitive, on word boundaries.
+PHRASE_RULES = [
+    # Redundant phrasing
+    (r"in order to", "to"),
+    (r"the reason (?:is|was) because", "because"),
+    (r"due to the fact that", "because"),
+    (r"for the purpose of", "for"),
+    (r"in the event that", "if"),
+    (r"at this point in time", "now"),
+    (r"a (?:large|great) number of", "many"),
+    (r"is able to", "can"),
+    (r"are able to", "can"),
+    # "Make sure to run X" -> "Run X"; "make sure (that) X passes" -> "ensure X passes"
+    (r"make sure to", _delete),
+    (r"make sure(?: that)?", "ensure"),
+    (r"remember to", _delete),
+    # Sentence-leading only ("if you should need help"), and not before
+    # "not": "you should not X" must keep its negation
+    (SENTENCE_START + r"you should\b(?: always\b)?(?!\s+not\b)", _delete),
+    # Hedging
+    (r"it might be worth(?: it)?(?: to)?", _delete),
+    (r"you (?:could|might|may) (?:want to )?consider", _delete),
+    (r"it would be (?:good|nice|best) to", _delete),
+    (r"i'?d recommend", _delete),
+    # Pleasantries
+    (SENTENCE_START + r"(?:sure|certainly|of course)\s*[,!]\s*", _delete),
+    (r"(?:i'?m |i am )?happy to", _delete),
+    # Connective fluff, sentence-leading only: mid-sentence "however" carries
+    # the contrast
+    (SENTENCE_START + r"(?:however|furthermore|additionally|moreover|in addition)\s*,\s*", _delete),
+]
+
+FILLER_WORDS = ("just", "really", "basically", "actually", "simply", "essentially", "generally")
+
+def _keep_case(replacement: str):
+    """Replacement that stays capitalized where the phrase was: "In order to" -> "To"."""
+    return lambda m: replacement.capitalize() if m.group(0)[:1].isupper() else replacement
+
+
+PHRASE_REGEXES = [
+    (re.compile(rf"\b{p}\b" if p[-1].isalpha() else rf"\b{p}", re.IGNORECASE), _keep_case(r) if isinstance(r, str) else r)
+    for p, r in PHRASE_RULES
+]
+# Not inside hyphenated words: "just-in-time", "simply-typed"
+FILLER_REGEX = re.compile(rf"(?<![-\w])(?:{'|'.join(FILLER_WORDS)})(?![-\w]),?\s*", re.IGNORECASE)
+# Articles followed by a lowercase word. A capital "A" is never dropped: it
+# is as often a label ("choose A or B") as an article; nor is "a" in "a or b".
+ARTICLE_REGEX = re.compile(r"\b(?:a|an|the|An|The)\s+(?=[a-z])(?!(?:or|and|to)\s+\w\b)")
+
+SPACES_REGEX = re.compile(r"(?<=\S) {2,}")
+# Not before a dot or colon that starts a word: ".env", "./run", ":root"
+SPACE_BEFORE_PUNCT_REGEX = re.compile(r"(?<=\S) +(?=[,.;:!?](?![\w/~.]))")
+# Comma stranded before the end of a sentence by a removed word: "it, really."
+ORPHAN_COMMA_REGEX = re.compile(r",\s*(?=[.!?](?![\w/~.]))")
+LIST_MARKER_REGEX = re.compile(r"^(\s*(?:[-*+]|\d+[.)])\s+|\s*>\s*|\s*\|)")
+
+
+def _rewrite(segment: str) -> str:
+    for regex, replacement in PHRASE_REGEXES:
+        segment = regex.sub(replacement, segment)
+    segment = FILLER_REGEX.sub(_delete, segment)
+    segment = ARTICLE_REGEX.sub(_delete, segment)
+    segment = RECAP_REGEX.sub(lambda m: m.group(1).upper(), segment)
+    segment = SPACES_REGEX.sub(" ", segment)
+    segment = SPACE_BEFORE_PUNCT_REGEX.sub("", segment)
+    return ORPHAN_COMMA_REGEX.sub("", segment)
+
+
+def compress_line(line: str) -> str:
+    """Apply the rewrite rules to one prose line, leaving protected spans alone."""
+    m = LIST_MARKER_REGEX.match(line)
+    prefix = m.group(0) if m else line[: len(line) - len(line.lstrip())]
+    body = line[len(prefix):]
+
+    out = []
+    pos = 0
+    for span in PROTECTED_REGEX.finditer(body):
+        out.append(_rewrite(body[pos:span.start()]))
+        out.append(span.group(0))
+        pos = span.end()
+    out.append(_rewrite(body[pos:]))
+    lead = body[: len(body) - len(body.lstrip())]
+    rewritten = "".join(out).lstrip(" ,").rstrip()
+    if not body.rstrip().endswith(","):
+        rewritten = rewritten.rstrip(",")  # "delete it, really" -> "delete it"
+    return prefix + lead + rewritten
+
+
+def compress_text(text: str) -> str:
+    """Compress all prose lines of a markdown document."""
+    out: List[str] = []
+    fence = None
+    in_frontmatter = False
+    in_indented_code = False
+    prev_blank = True
+
+    for i, line in enumerate(text.split("\n")):
+        stripped = line.strip()
+        m = FENCE_OPEN_REGEX.match(line)
+        if fence is not None:
+            if m and m.group(2)[0] == fence[0] and len(m.group(2)) >= fence[1] and not m.group(3).strip():
+                fence = None
+            out.append(line)
+            continue
+        if m:
+            fence = (m.group(2)[0], len(m.group(2)))
+            out.append(line)
+            continue
+        if i == 0 and stripped == "---":
+            in_frontmatter = True
+            out.append(line)
+            continue
+        if in_frontmatter:
+            in_frontmatter = stripped not in ("---", "...")
+            out.append(line)
+            continue
+
+        indented = line.startswith(("    ", "\t"))
+        if in_indented_code and (indented or not stripped):
+            out.append(line)
+            continue
+        in_indented_code = prev_blank and indented and not LIST_MARKER_REGEX.match(line)
+
+        if (
+            not stripped
+            or in_indented_code
+            or stripped.startswith("#")
+            or stripped.startswith("<")
+            or set(stripped) <= set("|-:= ")
+        ):
+            out.append(line)
+        else:
+            out.append(compress_line(line))
+        prev_blank = not stripped
+
+    return "\n".join(out)
+
+
+# ---------- CLI ----------
+
+if __name__ == "__main__":
+    try:
+        from .tokenizer import count_tokens
+    except ImportError:
+        from tokenizer import count_tokens
+
+    if len(sys.argv) != 2:
+        print("Usage: python lexical.py <file>")
+        sys.exit(1)
+
+    source = Path(sys.argv[1]).read_text(errors="ignore")
+    result = compress_text(source)
+    print(result)
+    before, after = count_tokens(source), count_tokens(result)
+    saved = 100 * (before - after) / before if before else 0.0
+    print(f"\nTokens: {before} -> {after} ({saved:.1f}% saved)", file=sys.stderr)
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+"""Mechanical repair of structural validation errors, without a model call.
+
+The original is always at hand, so the most common failures can be
+undone locally: altered or dropped fenced code blocks are restored
+byte-for-byte, changed heading lines are put back, mangled URLs are
+corrected and lost ones re-inserted, and hallucinated URLs removed.
+Repairs are done per heading section when the section structure lines
+up, so restored content lands next to where it belongs.
+"""
+
+import difflib
+import re
+from typing import Callable, List, Tuple
+
+from .sections import align_sections, join_sections, split_sections
+from .validate import FENCE_OPEN_REGEX, scan
+
+# Minimum similarity for treating an unexpected URL as a mangled lost one.
+URL_MATCH_CUTOFF = 0.8
+
+
+# ---------- Helpers ----------
+
+
+def _map_prose_lines(text: str, fn: Callable[[str], str]) -> str:
+    """Apply ``fn`` to every line outside fenced code blocks."""
+    out = []
+    fence = None
+    for line in text.split("\n"):
+        m = FENCE_OPEN_REGEX.match(line)
+        if fence is not None:
+            if m and m.group(2)[0] == fence[0] and len(m.group(2)) >= fence[1] and not m.group(3).strip():
+                fence = None
+            out.append(line)
+        elif m:
+            fence = (m.group(2)[0], len(m.group(2)))
+            out.append(line)
+        else:
+            out.append(fn(line))
+    return "\n".join(out)
+
+
+def _apply_edits(lines: List[str], edits: List[Tuple[int, int, List[str]]]) -> List[str]:
+    """Replace ``lines[start:end]`` with each replacement, last edit first."""
+    for start, end, replacement in sorted(edits, key=lambda e: (e[0], e[1]), reverse=True):
+        lines[start:end] = replacement
+    return lines
+
+
+# ---------- Repairs ----------
+
+
+def restore_headings(original: str, compressed: str) -> str:
+    """Put back the exact original heading lines when only their text changed."""
+    o, c = scan(original), scan(compressed)
+    if len(o.headings) != len(c.headings) or o.headings == c.headings:
+        return compressed
+    orig_lines = original.split("\n")
+    lines = compressed.split("\n")
+    for oh, ch, ol, cl in zip(o.headings, c.headings, o.heading_lines, c.heading_lines):
+        if oh != ch:
+            lines[cl - 1] = orig_lines[ol - 1]
+    return "\n".join(lines)
+
+
+def restore_code_blocks(original: str, compressed: str) -> str:
+    """Make the fenced code blocks of ``compressed`` identical to the original's.
+
+    Blocks are aligned with a sequence diff: changed blocks are replaced
+    in place, missing ones inserted after the preceding kept block, and
+    extra ones dropped.
+    """
+    o, c = scan(original), scan(compressed)
+    if o.code_blocks == c.code_blocks:
+        return compressed
+    lines = compressed.split("\n")
+    edits = []
+
+    def span(j):  # 0-based [start, end) line range of compressed block j
+        first, last = c.code_block_lines[j]
+        return first - 1, last
+
+    matcher = difflib.SequenceMatcher(a=o.code_blocks, b=c.code_blocks, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        if tag == "replace" and i2 - i1 == j2 - j1:
+            for k in range(i2 - i1):
+                start, end = span(j1 + k)
+                edits.append((start, end, o.code_blocks[i1 + k].split("\n")))
+            continue
+        restored = []
+        for block in o.code_blocks[i1:i2]:
+            restored += [""] + block.split("\n") + [""]
+        if j2 > j1:
+            start, _ = span(j1)
+            _, end = span(j2 - 1)
+            edits.append((start, end, restored))
+        elif j1 > 0:
+            _, end = span(j1 - 1)
+            edits.append((end, end, restored))
+        elif c.code_block_lines:
+            start, _ = span(0)
+            edits.append((start, start, restored))
+        else:
+            edits.append((len(lines), len(lines), restored))
+    return "\n".join(_apply_edits(lines, edits))
+
+
+def restore_urls(original: str, compressed: str) -> str:
+    """Fix lost, mangled and invented URLs in prose.
+
+    A lost URL that closely matches an unexpected one is substituted in
+    place; otherwise the original line carrying it is appended. URLs that
+    were never in the original are removed (keeping a link's text).
+    """
+    o, c = scan(original), scan(compressed)
+    lost = o.urls - c.urls
+    added = set(c.urls - o.urls)
+    if not lost and not added:
+        return compressed
+
+    orig_lines = original.split("\n")
+    substitutions = {}
+    appended = []
+    for url in sorted(lost):
+        match = difflib.get_close_matches(url, sorted(added), n=1, cutoff=URL_MATCH_CUTOFF)
+        if match:
+            substitutions[match[0]] = url
+            added.discard(match[0])
+        else:
+            appended.append(orig_lines[o.url_lines[url] - 1].rstrip())
+
+    patterns = []
+    for bad, good in substitutions.items():
+        patterns.append((re.compile(re.escape(bad) + r"(?=[\s)]|$)"), good.replace("\\", "\\\\")))
+    for bad in sorted(added):
+        escaped = re.escape(bad)
+        patterns.append((re.compile(r"\[([^\]]*)\]\(" + escaped + r"\)"), r"\1"))
+        patterns.append((re.compile(r" ?" + escaped + r"(?=[\s)]|$)"), ""))
+
+    def fix_line(line: str) -> str:
+        if "://" not in line:
+            return line
+        for regex, replacement in patterns:
+            line = regex.sub(replacement, line)
+        return line
+
+    repaired = _map_prose_lines(compressed, fix_line) if patterns else compressed
+    if appended:
+        repaired = repaired.rstrip("\n") + "\n\n" + "\n".join(dict.fromkeys(appended))
+    return repaired
+
+
+def _repair_part(original: str, compressed: str) -> str:
+    compressed = restore_code_blocks(original, compressed)
+    return restore_urls(original, compressed)
+
+
+def repair(original: str, compressed: str) -> str:
+    """Locally repair ``compressed`` against ``original``; returns the new text."""
+    compressed = restore_headings(original, compressed)
+    sections = split_sections(original)
+    aligned = align_sections(sections, compressed)
+    if aligned is None:
+        return _repair_part(original, compressed)
+    return join_sections([
+        _repair_part(orig.text, comp.text) for orig, comp in zip(sections, aligned)
+    ])
@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""Offline content-retention check between an original and its compression.
+
+Structure checks cannot see a dropped paragraph of instructions. This
+compares the terms of each original paragraph against the compressed
+counterpart of its section: numbers, identifiers (``snake_case``,
+``camelCase``, ``dotted.names``, inline code) and content keywords,
+weighted by type and by how specific they are to the paragraph (idf
+across paragraphs). A score is the weighted share of terms still present;
+a section is flagged when its score, or that of any one paragraph in it,
+falls below the threshold.
+
+All scores come out of one weighted count over the term ids of every
+paragraph (NumPy ``bincount`` when installed, plain Python otherwise)
+after a single regex pass per text: time and memory grow with the number
+of terms, not paragraphs x vocabulary, so this is cheap enough to run on
+every file.
+"""
+
+import math
+import os
+import re
+import sys
+from itertools import chain
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+try:
+    from .sections import align_sections, split_sections
+    from .validate import FENCE_OPEN_REGEX
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).parent))
+    from sections import align_sections, split_sections
+    from validate import FENCE_OPEN_REGEX
+
+# Minimum share of weighted terms kept, per section and per paragraph.
+DEFAULT_THRESHOLD = float(os.environ.get("CAVEMAN_RETENTION_MIN", "0.5"))
+PARAGRAPH_THRESHOLD = float(os.environ.get("CAVEMAN_RETENTION_PARAGRAPH_MIN", "0.3"))
+
+# Units carrying less total weight than this are too short to judge.
+MIN_SECTION_WEIGHT = 6.0
+MIN_PARAGRAPH_WEIGHT = 12.0
+MISSING_SHOWN = 5
+
+TYPE_WEIGHTS = {"number": 3.0, "identifier": 2.0, "keyword": 1.0}
+
+TERM_REGEX = re.compile(r"`([^`\n]+)`|(\d+(?:[.,:]\d+)*%?)|([A-Za-z_][\w./-]*\w|[A-Za-z]{4,})")
+IDENT_HINT_REGEX = re.compile(r"[_./\d]|[a-z][A-Z]|^[A-Z]{2,}")
+SUFFIXES = ("ing", "ed", "es", "s", "ly")
+
+# Frequent words that carry no instruction. Modal and negation words
+# (must, never, always, only, not) are deliberately absent.
+STOPWORDS = frozenset("""
+about above after again also because been before being below between both
+could does doing down during each from further have having here into itself
+just more most other over same some such than that their them then there these
+they this those through under until very what when where which while will with
+would your yours really basically actually simply quite
+""".split())
+
+
+_np = False
+
+
+def _numpy():
+    """NumPy, imported on first use (None when not installed)."""
+    global _np
+    if _np is False:
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        _np = numpy
+    return _np
+
+
+# ---------- Terms ----------
+
+
+def _stem(word: str) -> str:
+    for suffix in SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 4:
+            return word[: -len(suffix)]
+    return word
+
+
+def extract_terms(text: str) -> Dict[str, str]:
+    """Map each distinct term in ``text`` to its type (number/identifier/keyword)."""
+    terms: Dict[str, str] = {}
+    for code, number, word in TERM_REGEX.findall(text):
+        if code:
+            terms[code.strip()] = "identifier"
+        elif number:
+            terms[number] = "number"
+        elif IDENT_HINT_REGEX.search(word):
+            terms[word] = "identifier"
+        elif "-" in word:
+            for part in word.lower().split("-"):
+                if len(part) >= 4 and part not in STOPWORDS:
+                    terms.setdefault(_stem(part), "keyword")
+        else:
+            lower = word.lower()
+            if len(lower) >= 4 and lower not in STOPWORDS:
+                terms.setdefault(_stem(lower), "keyword")
+    return terms
+
+
+def paragraphs(text: str) -> List[Tuple[int, str]]:
+    """``(first line, text)`` of each blank-line-separated block outside code fences."""
+    out = []
+    buf: List[str] = []
+    start = 0
+    fence = None
+    for no, line in enumerate(text.split("\n"), 1):
+        m = FENCE_OPEN_REGEX.match(line)
+        if fence is not None:
+            if m and m.group(2)[0] == fence[0] and len(m.group(2)) >= fence[1] and not m.group(3).strip():
+                fence = None
+            continue
+        if m:
+            fence = (m.group(2)[0], len(m.group(2)))
+        if m or not line.strip():
+            if buf:
+                out.append((start, "\n".join(buf)))
+                buf = []
+            continue
+        if not buf:
+            start = no
+        buf.append(line)
+    if buf:
+        out.append((start, "\n".join(buf)))
+    return out
+
+
+# ---------- Scoring ----------
+
+
+class SectionRetention:
+    """Retention of one section; ``worst`` is its lowest-scoring paragraph."""
+
+    __slots__ = ("label", "score", "weight", "missing", "worst")
+
+    def __init__(self, label: str, score: float, weight: float, missing: List[str], worst=None):
+        self.label = label
+        self.score = score
+        self.weight = weight
+        self.missing = missing
+        self.worst = worst  # (score, weight, first line, excerpt) or None
+
+    def __repr__(self):
+        return f"SectionRetention({self.label!r}, {self.score:.2f})"
+
+
+def _score(original_terms: List[Dict[str, str]], compressed_terms: List[Dict[str, str]]):
+    """Per-row (kept weight, total weight) pairs, plus each term's weight by term."""
+    vocab: Dict[str, int] = {}
+    types: List[str] = []
+    for terms in original_terms:
+        for term, kind in terms.items():
+            if term not in vocab:
+                vocab[term] = len(types)
+                types.append(kind)
+    n, v = len(original_terms), len(types)
+    if not v:
+        return [(0.0, 0.0)] * n, {}
+
+    # Rows as term-id vectors; each term appears at most once per row
+    rows = [[vocab[t] for t in terms] for terms in original_terms]
+    kept = [[vocab[t] for t in o if t in c] for o, c in zip(original_terms, compressed_terms)]
+
+    np = _numpy()
+    if np is not None:
+        def flat(lists):
+            lengths = np.fromiter(map(len, lists), dtype=np.intp, count=n)
+            ids = np.fromiter(chain.from_iterable(lists), dtype=np.intp, count=int(lengths.sum()))
+            return ids, np.repeat(np.arange(n), lengths)
+
+        ids, owner = flat(rows)
+        kept_ids, kept_owner = flat(kept)
+        df = np.bincount(ids, minlength=v)
+        weights = np.array([TYPE_WEIGHTS[k] for k in types]) * np.log1p(n / df)
+        total = np.bincount(owner, weights=weights[ids], minlength=n)
+        present = np.bincount(kept_owner, weights=weights[kept_ids], minlength=n)
+        return list(zip(present.tolist(), total.tolist())), dict(zip(vocab, weights.tolist()))
+
+    df = [0] * v
+    for cols in rows:
+        for c in cols:
+            df[c] += 1
+    weights = [TYPE_WEIGHTS[k] * math.log1p(n / d) for k, d in zip(types, df)]
+    out = []
+    for cols, kept_cols in zip(rows, kept):
+        total = sum(weights[c] for c in cols)
+        present = sum(weights[c] for c in kept_cols)
+        out.append((present, total))
+    return out, dict(zip(vocab, weights))
+
+
+def retention_report(original: str, compressed: str) -> List[SectionRetention]:
+    """Score every original section against its compressed counterpart.
+
+    Sections are paired by heading structure; when that no longer lines
+    up the whole document is scored as one section.
+    """
+    sections = split_sections(original)
+    aligned = align_sections(sections, compressed) if sections else None
+    if aligned is None:
+        pairs: List[Tuple[str, str, str]] = [("(document)", original, compressed)]
+    else:
+        pairs = [(s.label, s.text, c.text) for s, c in zip(sections, aligned)]
+
+    # One row per paragraph, checked against its whole compressed section
+    rows, row_section, row_info = [], [], []
+    comp_terms = []
+    for i, (_, orig_text, comp_text) in enumerate(pairs):
+        comp_terms.append(extract_terms(comp_text))
+        for line, para in paragraphs(orig_text):
+            rows.append(extract_terms(para))
+            row_section.append(i)
+            row_info.append((line, para))
+    scored, weights = _score(rows, [comp_terms[i] for i in row_section])
+
+    by_section: List[List[int]] = [[] for _ in pairs]
+    for r, sec in enumerate(row_section):
+        by_section[sec].append(r)
+
+    report = []
+    for i, (label, _, _) in enumerate(pairs):
+        idx = by_section[i]
+        kept = sum(scored[r][0] for r in idx)
+        total = sum(scored[r][1] for r in idx)
+        lost = {t for r in idx for t in rows[r] if t not in comp_terms[i]}
+        worst = None
+        for r in idx:
+            present, weight = scored[r]
+            if weight >= MIN_PARAGRAPH_WEIGHT and (worst is None or present / weight < worst[0]):
+                line, para = row_info[r]
+                worst = (present / weight, weight, line, " ".join(para.split())[:60])
+        report.append(SectionRetention(
+            label,
+            kept / total if total else 1.0,
+            total,
+            sorted(lost, key=lambda t: -weights[t])[:MISSING_SHOWN],
+            worst,
+        ))
+    return report
+
+
+def low_retention(
+    original: str, compressed: str, threshold: Optional[float] = None
+) -> List[SectionRetention]:
+    """Sections scoring below ``threshold``, or holding a paragraph below PARAGRAPH_THRESHOLD."""
+    threshold = DEFAULT_THRESHOLD if threshold is None else threshold
+    return [
+        r for r in retention_report(original, compressed)
+        if (r.weight >= MIN_SECTION_WEIGHT and r.score < threshold)
+        or (r.worst is not None and r.worst[0] < PARAGRAPH_THRESHOLD)
+    ]
+
+
+def describe(r: SectionRetention) -> str:
+    message = f"Low content retention in {r.label}: {100 * r.score:.0f}% kept (lost: {', '.join(r.missing)})"
+    if r.worst is not None and r.worst[0] < PARAGRAPH_THRESHOLD:
+        message += f"; paragraph at line {r.worst[2]} {100 * r.worst[0]:.0f}% kept (\"{r.worst[3]}...\")"
+    return message
+
+
+def add_retention_warnings(result, original: str, compressed: str, threshold: Optional[float] = None):
+    """Add a warning to ``result`` (a ValidationResult) per low-retention section."""
+    for r in low_retention(original, compressed, threshold):
+        result.add_warning(describe(r))
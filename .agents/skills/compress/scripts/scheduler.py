@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Rate-limit-aware dispatch for async model calls.
+
+Tracks requests and input tokens over a sliding 60s window and delays new
+requests so both stay just under the account limits. A 429/overloaded
+response pauses all dispatch (honouring ``retry-after``) and shrinks the
+effective limits; successes grow them back.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from typing import Optional
+
+DEFAULT_RPM = int(os.environ.get("CAVEMAN_RPM", "50"))
+DEFAULT_TPM = int(os.environ.get("CAVEMAN_TPM", "30000"))
+
+WINDOW = 60.0
+HEADROOM = 0.9  # aim just under the account limits
+MIN_SCALE = 0.25
+BACKOFF_SHRINK = 0.7
+RECOVER_STEP = 0.05
+DEFAULT_PAUSE = 5.0
+# Longest sleep before re-checking: finished requests settle their
+# reservation (on_success) and may free room before the window moves on.
+RECHECK = 0.5
+
+
+class RateLimitScheduler:
+    def __init__(self, rpm: int = DEFAULT_RPM, tpm: int = DEFAULT_TPM):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.scale = 1.0
+        self.paused_until = 0.0
+        self.rate_limited = 0
+        self._window = deque()  # [timestamp, tokens] per dispatched request
+        self._lock = None
+
+    def _limits(self):
+        factor = HEADROOM * self.scale
+        return max(1, int(self.rpm * factor)), max(1, int(self.tpm * factor))
+
+    def _prune(self, now: float):
+        while self._window and now - self._window[0][0] >= WINDOW:
+            self._window.popleft()
+
+    def _wait_time(self, tokens: int, now: float) -> float:
+        if now < self.paused_until:
+            return self.paused_until - now
+        self._prune(now)
+        if not self._window:
+            return 0.0  # an oversized request still goes out alone
+        rpm, tpm = self._limits()
+        used = sum(entry[1] for entry in self._window)
+        if len(self._window) < rpm and used + tokens <= tpm:
+            return 0.0
+        return max(0.01, self._window[0][0] + WINDOW - now)
+
+    async def acquire(self, tokens: int) -> list:
+        """Wait until a request of ``tokens`` input tokens fits; returns its ticket."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                delay = self._wait_time(tokens, now)
+                if delay <= 0:
+                    ticket = [now, tokens]
+                    self._window.append(ticket)
+                    return ticket
+                await asyncio.sleep(min(delay, RECHECK))
+
+    def on_success(self, ticket: Optional[list], actual_tokens: Optional[int] = None):
+        """Replace the estimate with measured usage and relax the limits."""
+        if ticket is not None and actual_tokens is not None:
+            ticket[1] = actual_tokens
+        self.scale = min(1.0, self.scale + RECOVER_STEP)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None):
+        """Pause dispatch and shrink the effective limits after a 429/overload."""
+        self.rate_limited += 1
+        self.scale = max(MIN_SCALE, self.scale * BACKOFF_SHRINK)
+        pause = retry_after if retry_after is not None else DEFAULT_PAUSE * (1.0 / self.scale)
+        self.paused_until = max(self.paused_until, time.monotonic() + pause)
@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""Content scan for secrets before a file is sent to the model.
+
+``is_sensitive_path`` only sees names; a ``notes.md`` holding an AWS key or
+a private-key block would still be shipped. This scans the text itself:
+known key formats match outright, while generic ``password = ...``
+assignments, URL credentials and long mixed-alphabet tokens must also look
+random (Shannon entropy) to count, so hashes, words and placeholders pass.
+
+Each pattern starts with a literal, which CPython's ``re`` finds with a
+fast prefix search; one alternation of all of them loses that and was
+about ten times slower. So the matcher is a handful of literal-anchored
+passes plus one split for long tokens: a 500KB file takes milliseconds.
+Verdicts are memoized per content hash, and :func:`scan_paths` scans many
+files across processes, so screening a whole tree before a batch is cheap.
+"""
+
+import hashlib
+import math
+import os
+import re
+import sys
+import threading
+from collections import Counter, OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+MEMO_SIZE = 4096
+
+# Minimum entropy (bits per char) of values only suspicious if random.
+ENTROPY_MIN = 3.5
+TOKEN_ENTROPY_MIN = 4.3
+TOKEN_MIN_LENGTH = 32
+
+# Below this many files a batch is scanned in-process.
+PARALLEL_MIN_FILES = 16
+
+# (kind, regex); the secret is the last group when there is one.
+KNOWN_PATTERNS = (
+    ("private_key", re.compile(r"-----BEGIN (?:[A-Z0-9]+ )*PRIVATE KEY(?: BLOCK)?-----")),
+    ("aws_access_key", re.compile(r"A(?:KIA|SIA|BIA|CCA)[0-9A-Z]{16}(?![0-9A-Za-z])")),
+    ("github_token", re.compile(r"gh(?:[pousr]_[A-Za-z0-9]{36,255}|ithub_pat_[A-Za-z0-9_]{60,255})")),
+    ("api_key", re.compile(r"sk-(?:ant-[A-Za-z0-9_-]{32,}|(?:proj-)?[A-Za-z0-9_-]{20,}T3BlbkFJ[A-Za-z0-9_-]{20,})")),
+    ("slack_token", re.compile(r"xox[abprs]-[A-Za-z0-9-]{10,}")),
+    ("stripe_key", re.compile(r"k_live_[0-9A-Za-z]{24,}")),
+    ("google_api_key", re.compile(r"AIza[0-9A-Za-z_-]{35}")),
+    ("jwt", re.compile(r"eyJ[A-Za-z0-9_-]{10,}\.eyJ[A-Za-z0-9_-]{10,}\.[A-Za-z0-9_-]{10,}")),
+)
+# Patterns that may not start mid-word (stripe keys begin one char earlier).
+WORD_START = {"aws_access_key", "github_token", "api_key", "slack_token", "google_api_key", "jwt"}
+
+URL_PASSWORD_REGEX = re.compile(r"://[^\s/:@]+:([^\s/@]{8,})@")
+ASSIGNMENT_REGEX = re.compile(r"""[:=][ \t]*["']?([^\s"'`]{12,})""")
+# Checked against the text just before an assignment's ':' or '='.
+SECRET_NAME_REGEX = re.compile(
+    r"(?i)(?:api[_-]?key|secret(?:[_-]?key)?|token|passw(?:or)?d|access[_-]?key|client[_-]?secret)[\"']?\s*$"
+)
+TOKEN_REGEX = re.compile(r"[A-Za-z0-9+/_-]+={0,2}")
+TOKEN_STRIP = "\"'`,;:.()[]{}<>"
+
+_memo: "OrderedDict[bytes, tuple]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def scan_enabled() -> bool:
+    return os.environ.get("CAVEMAN_SECRET_SCAN", "1").lower() not in ("0", "false", "no", "off")
+
+
+class Finding:
+    __slots__ = ("kind", "line", "preview")
+
+    def __init__(self, kind: str, line: int, preview: str):
+        self.kind = kind
+        self.line = line
+        self.preview = preview  # redacted: first chars only
+
+    def __str__(self):
+        return f"{self.kind} at line {self.line} ({self.preview})"
+
+    def __repr__(self):
+        return f"Finding({self.kind!r}, {self.line})"
+
+
+def entropy(value: str) -> float:
+    """Shannon entropy of ``value`` in bits per character."""
+    n = len(value)
+    return -sum(c / n * math.log2(c / n) for c in Counter(value).values())
+
+
+def _random_token(value: str) -> bool:
+    if entropy(value) < TOKEN_ENTROPY_MIN:
+        return False
+    # Hex digests and identifiers are not secrets: require all three classes
+    if not (any(c.isdigit() for c in value) and any(c.isupper() for c in value) and any(c.islower() for c in value)):
+        return False
+    # Paths: base64 has the odd '/', not runs of word-like segments
+    return value.count("/") < 3
+
+
+def _redact(value: str) -> str:
+    return value[:4] + "…" if len(value) > 4 else "…"
+
+
+def scan_text(text: str) -> List[Finding]:
+    """Every likely secret in ``text``, ordered by position."""
+    hits = []
+    for kind, regex in KNOWN_PATTERNS:
+        for m in regex.finditer(text):
+            start, value = m.start(), m.group()
+            if kind in WORD_START and start and text[start - 1].isalnum():
+                continue
+            if kind == "stripe_key":
+                if start == 0 or text[start - 1] not in "rs":
+                    continue
+                start, value = start - 1, text[start - 1] + value
+            hits.append((start, kind, value))
+    for m in URL_PASSWORD_REGEX.finditer(text):
+        if entropy(m.group(1)) >= ENTROPY_MIN:
+            hits.append((m.start(1), "url_password", m.group(1)))
+    # Generic rules only report what no specific rule already did
+    found = {start for start, _, _ in hits}
+    for m in ASSIGNMENT_REGEX.finditer(text):
+        value = m.group(1)
+        if (
+            m.start(1) not in found
+            and entropy(value) >= ENTROPY_MIN
+            and SECRET_NAME_REGEX.search(text, max(0, m.start() - 40), m.start())
+        ):
+            hits.append((m.start(1), "secret_assignment", value))
+            found.add(m.start(1))
+    offset = 0
+    for word in text.split():
+        if len(word) < TOKEN_MIN_LENGTH:
+            continue
+        offset = text.find(word, offset)
+        token = word.strip(TOKEN_STRIP)
+        if len(token) >= TOKEN_MIN_LENGTH and TOKEN_REGEX.fullmatch(token) and _random_token(token):
+            start = offset + word.index(token)
+            if not any(start <= f < start + len(token) for f in found):
+                hits.append((start, "random_token", token))
+        offset += len(word)
+    hits.sort()
+    return [Finding(kind, text.count("\n", 0, start) + 1, _redact(value)) for start, kind, value in hits]
+
+
+def _key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+
+
+def _memo_put(key: bytes, findings: tuple):
+    with _memo_lock:
+        _memo[key] = findings
+        _memo.move_to_end(key)
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+
+
+def scan_secrets(text: str) -> List[Finding]:
+    """:func:`scan_text`, memoized by content hash."""
+    key = _key(text)
+    with _memo_lock:
+        found = _memo.get(key)
+        if found is not None:
+            _memo.move_to_end(key)
+            return list(found)
+    found = tuple(scan_text(text))
+    _memo_put(key, found)
+    return list(found)
+
+
+def describe(findings: List[Finding], shown: int = 3) -> str:
+    more = len(findings) - shown
+    text = ", ".join(str(f) for f in findings[:shown])
+    return text + (f", +{more} more" if more > 0 else "")
+
+
+# ---------- Batches ----------
+
+
+def _scan_path(path: str):
+    """Worker: ``(content key, findings)`` for one file, or None if unreadable."""
+    try:
+        text = Path(path).read_text(errors="ignore")
+    except OSError:
+        return None
+    return _key(text), tuple(scan_text(text))
+
+
+def scan_paths(paths: Iterable[Path], jobs: Optional[int] = None) -> Dict[Path, List[Finding]]:
+    """Scan files, in worker processes when there are many; seeds the memo.
+
+    Returns findings per path (unreadable files are left out). Later
+    :func:`scan_secrets` calls on the same content are memo hits.
+    """
+    paths = list(paths)
+    if len(paths) < PARALLEL_MIN_FILES or (os.cpu_count() or 1) < 2:
+        results = map(_scan_path, map(str, paths))
+    else:
+        workers = jobs or min(os.cpu_count() or 2, 8)
+        pool = ProcessPoolExecutor(max_workers=workers)
+        with pool:
+            results = list(pool.map(_scan_path, map(str, paths), chunksize=8))
+    out = {}
+    for path, result in zip(paths, results):
+        if result is None:
+            continue
+        key, findings = result
+        _memo_put(key, findings)
+        out[path] = list(findings)
+    return out
+
+
+# ---------- CLI ----------
+
+if __name__ == "__main__":
+    targets = [Path(a) for a in sys.argv[1:]]
+    if not targets:
+        print("Usage: python secretscan.py <file> [...]")
+        sys.exit(1)
+    dirty = 0
+    for path, findings in scan_paths(targets).items():
+        if findings:
+            dirty += 1
+            print(f"🔒 {path}: {describe(findings, shown=len(findings))}")
+    print(f"{len(targets)} file(s) scanned, {dirty} with likely secrets")
+    sys.exit(1 if dirty else 0)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""Split markdown into heading-delimited sections for independent compression."""
+
+import sys
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+try:
+    from .sidecar import sha256_text
+    from .validate import FENCE_OPEN_REGEX, HEADING_REGEX
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).parent))
+    from sidecar import sha256_text
+    from validate import FENCE_OPEN_REGEX, HEADING_REGEX
+
+
+class Section:
+    def __init__(self, heading: Optional[Tuple[str, str]], text: str):
+        self.heading = heading  # (level marks, title) or None for the preamble
+        self.text = text
+
+    @property
+    def hash(self) -> str:
+        return sha256_text(self.text)
+
+    @property
+    def label(self) -> str:
+        return f"{self.heading[0]} {self.heading[1]}" if self.heading else "(preamble)"
+
+    @property
+    def has_body(self) -> bool:
+        """False for sections that are only a heading line (nothing to compress)."""
+        lines = self.text.strip("\n").split("\n")
+        if self.heading is not None:
+            lines = lines[1:]
+        return any(line.strip() for line in lines)
+
+
+def split_sections(text: str) -> List[Section]:
+    """Split ``text`` before every ATX heading that is outside a fenced block.
+
+    Text before the first heading (frontmatter, intro) becomes a preamble
+    section with ``heading=None``; it is dropped when blank. Joining the
+    ``text`` of all returned sections reproduces the input.
+    """
+    sections = []
+    heading = None
+    buf = []
+    fence = None  # (char, length) of the open fence, if any
+
+    for line in text.splitlines(keepends=True):
+        bare = line.rstrip("\r\n")
+        m = FENCE_OPEN_REGEX.match(bare)
+        if fence is None:
+            if m:
+                fence = (m.group(2)[0], len(m.group(2)))
+            else:
+                h = HEADING_REGEX.match(bare)
+                if h:
+                    if buf and (heading is not None or "".join(buf).strip()):
+                        sections.append(Section(heading, "".join(buf)))
+                    heading = (h.group(1), h.group(2).strip())
+                    buf = []
+        elif (
+            m
+            and m.group(2)[0] == fence[0]
+            and len(m.group(2)) >= fence[1]
+            and m.group(3).strip() == ""
+        ):
+            fence = None
+        buf.append(line)
+
+    if buf and (heading is not None or "".join(buf).strip()):
+        sections.append(Section(heading, "".join(buf)))
+    return sections
+
+
+def join_sections(parts: List[str]) -> str:
+    """Join compressed section bodies with one blank line between them."""
+    return "\n\n".join(p.strip("\n") for p in parts if p.strip())
+
+
+def align_sections(original: List[Section], compressed_text: str) -> Optional[List[Section]]:
+    """Pair each original section with its compressed counterpart.
+
+    Returns None when the compressed output no longer has the same section
+    structure (count and heading levels), in which case per-section reuse is
+    not safe.
+    """
+    compressed = split_sections(compressed_text)
+    if len(compressed) != len(original):
+        return None
+    for a, b in zip(original, compressed):
+        if (a.heading is None) != (b.heading is None):
+            return None
+        if a.heading and a.heading[0] != b.heading[0]:
+            return None
+    return compressed
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Per-file metadata stored next to the backup as ``<name>.caveman.json``.
+
+Both ``CLAUDE.md`` and its backup ``CLAUDE.original.md`` map to the same
+``CLAUDE.caveman.json``. Callers own top-level keys (e.g. ``sections``);
+unknown keys are preserved on save.
+"""
+
+import hashlib
+import json
+import sys
+from pathlib import Path
+from typing import Optional
+
+# Support both direct execution and module import
+try:
+    from .fileio import atomic_write_text
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).parent))
+    from fileio import atomic_write_text
+
+SIDECAR_SUFFIX = ".caveman.json"
+
+
+def sidecar_path(path: Path) -> Path:
+    stem = path.stem.removesuffix(".original")
+    return path.with_name(stem + SIDECAR_SUFFIX)
+
+
+def load_sidecar(path: Path) -> dict:
+    """Return the sidecar for ``path``, or an empty dict if missing or unreadable."""
+    try:
+        data = json.loads(sidecar_path(path).read_text())
+    except (OSError, ValueError):
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def save_sidecar(path: Path, **updates) -> dict:
+    """Merge ``updates`` into the sidecar for ``path`` and write it back."""
+    data = load_sidecar(path)
+    data.update(updates)
+    write_sidecar(path, data)
+    return data
+
+
+def write_sidecar(path: Path, data: Optional[dict]):
+    """Replace the whole sidecar for ``path``; None removes it."""
+    target = sidecar_path(path)
+    if data is None:
+        target.unlink(missing_ok=True)
+    else:
+        atomic_write_text(target, json.dumps(data, indent=1, sort_keys=True) + "\n", durable=False)
+
+
+def sha256_text(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8", errors="surrogatepass")).hexdigest()
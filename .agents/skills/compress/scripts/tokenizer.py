@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""Token counting for budgets, savings reports and rate limiting.
+
+The tiktoken ``o200k_base`` encoding is loaded on first use, not at
+import, so runs that never count tokens do not pay for it. Counts are
+memoized per content hash and batches are encoded across threads. Without
+tiktoken a fast estimator stands in, scaled by :func:`calibrate`.
+"""
+
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Iterable, List, Optional
+
+ENCODING = "o200k_base"
+MEMO_SIZE = 8192
+BATCH_THREADS = int(os.environ.get("CAVEMAN_TOKENIZER_THREADS", "8"))
+
+# Rough pre-tokenizer: words, numbers and single punctuation marks. BPE
+# splits long words further, about one extra token per LONG_WORD chars.
+PIECE_REGEX = re.compile(r"[A-Za-z]+|\d{1,3}|[^\sA-Za-z\d]")
+LONG_WORD = 7
+
+# Multiplier applied to the raw estimate; refit with calibrate().
+_scale = float(os.environ.get("CAVEMAN_TOKEN_SCALE", "1.0"))
+
+_enc = None
+_enc_loaded = False
+_enc_lock = threading.Lock()
+_memo: "OrderedDict[bytes, int]" = OrderedDict()
+_memo_lock = threading.Lock()
+
+
+def get_encoding():
+    """The tiktoken encoding, loaded on first call; None if it cannot be loaded.
+
+    tiktoken downloads encodings on first use, so offline runs (``--local``,
+    replay, synthetic) can fail here with a network error even when it is
+    installed; they fall back to the estimator, and loading is not retried.
+    """
+    global _enc, _enc_loaded
+    if not _enc_loaded:
+        with _enc_lock:
+            if not _enc_loaded:
+                try:
+                    import tiktoken
+
+                    _enc = tiktoken.get_encoding(ENCODING)
+                except Exception:
+                    _enc = None
+                _enc_loaded = True
+    return _enc
+
+
+def name() -> str:
+    return ENCODING if get_encoding() is not None else "estimate"
+
+
+def _raw_estimate(text: str) -> float:
+    total = 0
+    for piece in PIECE_REGEX.findall(text):
+        total += 1 + (len(piece) - 1) // LONG_WORD
+    return total
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast tokenizer-free estimate of the o200k token count."""
+    return int(round(_raw_estimate(text) * _scale))
+
+
+def calibrate(samples: Iterable[str]) -> Optional[float]:
+    """Fit the estimator's scale to real counts over ``samples``.
+
+    Needs tiktoken; returns the new scale (also set for this process), or
+    None when it cannot be computed. Persist it with CAVEMAN_TOKEN_SCALE.
+    """
+    global _scale
+    enc = get_encoding()
+    if enc is None:
+        return None
+    samples = list(samples)
+    raw = sum(_raw_estimate(t) for t in samples)
+    if not raw:
+        return None
+    real = sum(len(tokens) for tokens in enc.encode_ordinary_batch(samples, num_threads=BATCH_THREADS))
+    _scale = real / raw
+    return _scale
+
+
+def _key(text: str) -> bytes:
+    return hashlib.blake2b(text.encode("utf-8", errors="surrogatepass"), digest_size=16).digest()
+
+
+def _memo_get(key: bytes) -> Optional[int]:
+    with _memo_lock:
+        count = _memo.get(key)
+        if count is not None:
+            _memo.move_to_end(key)
+        return count
+
+
+def _memo_put(key: bytes, count: int):
+    with _memo_lock:
+        _memo[key] = count
+        _memo.move_to_end(key)
+        while len(_memo) > MEMO_SIZE:
+            _memo.popitem(last=False)
+
+
+def count_tokens(text: str) -> int:
+    enc = get_encoding()
+    if enc is None:
+        return estimate_tokens(text)
+    key = _key(text)
+    count = _memo_get(key)
+    if count is None:
+        count = len(enc.encode_ordinary(text))
+        _memo_put(key, count)
+    return count
+
+
+def count_tokens_batch(texts: List[str]) -> List[int]:
+    """Token counts for ``texts``; uncached ones are encoded in one threaded batch."""
+    enc = get_encoding()
+    if enc is None:
+        return [estimate_tokens(t) for t in texts]
+    keys = [_key(t) for t in texts]
+    counts = [_memo_get(k) for k in keys]
+    misses = [i for i, c in enumerate(counts) if c is None]
+    if misses:
+        encoded = enc.encode_ordinary_batch([texts[i] for i in misses], num_threads=BATCH_THREADS)
+        for i, tokens in zip(misses, encoded):
+            counts[i] = len(tokens)
+            _memo_put(keys[i], counts[i])
+    return counts
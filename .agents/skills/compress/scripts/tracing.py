@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""Lightweight spans for profiling the compress pipeline.
+
+``with span("model", backend="anthropic") as s: ...; s.set(input_tokens=n)``
+times a block and hands the finished :class:`Span` to every registered
+sink. Spans nest through a context variable, so model calls running in
+asyncio tasks or (via :func:`bind`) worker threads keep their parent.
+With no sink registered ``span`` returns a shared no-op, so the hooks
+cost next to nothing in normal runs.
+
+Sinks:
+    MemorySink     keeps spans in a list (tests, --profile)
+    JSONLSink      appends one JSON object per span to a file
+    OTelSink       re-emits spans through an OpenTelemetry tracer
+    ProfileSink    aggregates per-name totals for a printed breakdown
+
+``CAVEMAN_TRACE=<file.jsonl>`` or ``CAVEMAN_TRACE=otel`` registers a sink
+at import.
+"""
+
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+_current: contextvars.ContextVar = contextvars.ContextVar("caveman_span", default=None)
+_ids = itertools.count(1)
+_sinks: List["Sink"] = []
+_sinks_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ("name", "span_id", "parent_id", "start_ns", "end_ns", "attrs", "_t0", "_token")
+
+    def __init__(self, name: str, attrs: dict):
+        self.name = name
+        self.span_id = next(_ids)
+        parent = _current.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attrs = attrs
+        self.start_ns = self.end_ns = 0
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, key: str, amount=1):
+        self.attrs[key] = self.attrs.get(key, 0) + amount
+
+    @property
+    def duration(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e9
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "id": self.span_id,
+            "parent": self.parent_id,
+            "start": self.start_ns / 1e9,
+            "duration": self.duration,
+            **({"attrs": self.attrs} if self.attrs else {}),
+        }
+
+    def __enter__(self):
+        self._token = _current.set(self)
+        self.start_ns = time.time_ns()
+        self._t0 = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = self.start_ns + (time.perf_counter_ns() - self._t0)
+        _current.reset(self._token)
+        if exc_type is not None:
+            self.attrs["error"] = exc_type.__name__
+        for sink in list(_sinks):
+            sink.emit(self)
+        return False
+
+
+class _NullSpan:
+    """Stand-in used while no sink is registered."""
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, key: str, amount=1):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **attrs):
+    """Context manager timing a block as ``name``; a no-op without sinks."""
+    if not _sinks:
+        return NULL_SPAN
+    return Span(name, attrs)
+
+
+def bind(fn: Callable) -> Callable:
+    """Wrap ``fn`` to run in a copy of the caller's context (for worker threads)."""
+    ctx = contextvars.copy_context()
+    return lambda *args, **kwargs: ctx.copy().run(fn, *args, **kwargs)
+
+
+# ---------- Sinks ----------
+
+
+class Sink:
+    def emit(self, span: Span):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemorySink(Sink):
+    def __init__(self):
+        self.spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def emit(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def named(self, name: str) -> List[Span]:
+        return [s for s in self.spans if s.name == name]
+
+
+class JSONLSink(Sink):
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def emit(self, span: Span):
+        line = json.dumps(span.to_dict(), default=str) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class OTelSink(Sink):
+    """Re-emit finished spans through OpenTelemetry (``pip install opentelemetry-api``).
+
+    Spans keep their real start/end times; nesting is carried in the
+    ``caveman.span_id`` / ``caveman.parent_id`` attributes.
+    """
+
+    def __init__(self, tracer=None):
+        if tracer is None:
+            from opentelemetry import trace as otel_trace
+
+            tracer = otel_trace.get_tracer("caveman.compress")
+        self._tracer = tracer
+
+    def emit(self, span: Span):
+        attrs = {
+            f"caveman.{k}": v if isinstance(v, (str, bool, int, float)) else str(v)
+            for k, v in span.attrs.items()
+        }
+        attrs["caveman.span_id"] = span.span_id
+        if span.parent_id is not None:
+            attrs["caveman.parent_id"] = span.parent_id
+        otel_span = self._tracer.start_span(span.name, start_time=span.start_ns, attributes=attrs)
+        otel_span.end(end_time=span.end_ns)
+
+
+class ProfileSink(Sink):
+    """Per-name count/total/max, plus summed numeric attributes (tokens, retries)."""
+
+    def __init__(self):
+        self.stats: Dict[str, dict] = {}
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+
+    def emit(self, span: Span):
+        with self._lock:
+            s = self.stats.setdefault(span.name, {"count": 0, "total": 0.0, "max": 0.0, "sums": {}})
+            s["count"] += 1
+            s["total"] += span.duration
+            s["max"] = max(s["max"], span.duration)
+            for key, value in span.attrs.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    s["sums"][key] = s["sums"].get(key, 0) + value
+
+    def report(self):
+        wall = time.perf_counter() - self._started
+        print("\n| Span | Count | Total s | Mean ms | Max ms | % wall | Totals |")
+        print("|------|-------|---------|---------|--------|--------|--------|")
+        for name, s in sorted(self.stats.items(), key=lambda kv: -kv[1]["total"]):
+            sums = ", ".join(f"{k}={v:g}" for k, v in sorted(s["sums"].items()))
+            print(
+                f"| {name} | {s['count']} | {s['total']:.3f} | {1000 * s['total'] / s['count']:.1f} "
+                f"| {1000 * s['max']:.1f} | {100 * s['total'] / wall if wall else 0:.0f}% | {sums} |"
+            )
+        print(f"\nWall time: {wall:.3f}s (concurrent spans can add up to more)")
+
+
+def add_sink(sink: Sink) -> Sink:
+    with _sinks_lock:
+        _sinks.append(sink)
+    return sink
+
+
+def remove_sink(sink: Sink):
+    with _sinks_lock:
+        if sink in _sinks:
+            _sinks.remove(sink)
+    sink.close()
+
+
+def _configure_from_env():
+    target = os.environ.get("CAVEMAN_TRACE")
+    if not target:
+        return
+    if target == "otel":
+        try:
+            add_sink(OTelSink())
+        except ImportError:
+            print("⚠️ CAVEMAN_TRACE=otel needs opentelemetry-api; tracing disabled")
+    else:
+        add_sink(JSONLSink(Path(target).expanduser()))
+
+
+_configure_from_env()
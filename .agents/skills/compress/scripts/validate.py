@@ -1,6 +1,18 @@
 #!/usr/bin/env python3
+import io
 import re
+import sys
 from pathlib import Path
+from typing import Optional
+
+# Support both direct execution and module import
+try:
+    from .sidecar import load_sidecar, save_sidecar, sha256_text
+    from .tracing import span
+except ImportError:
+    sys.path.insert(0, str(Path(__file__).parent))
+    from sidecar import load_sidecar, save_sidecar, sha256_text
+    from tracing import span
 
 URL_REGEX = re.compile(r"https?://[^\s)]+")
 FENCE_OPEN_REGEX = re.compile(r"^(\s{0,3})(`{3,}|~{3,})(.*)$")
@@ -12,15 +24,38 @@ BULLET_REGEX = re.compile(r"^\s*[-*+]\s+", re.MULTILINE)
 PATH_REGEX = re.compile(r"(?:\./|\.\./|/|[A-Za-z]:\\)[\w\-/\\\.]+|[\w\-\.]+[/\\][\w\-/\\\.]+")
 
 
+class Issue:
+    """A validation error with where it happened and what was expected.
+
+    ``lines`` is a 1-based inclusive (start, end) span in the checked
+    (compressed) text, when known. ``expected``/``actual`` hold the
+    original and candidate values (code block, URLs, counts).
+    """
+
+    def __init__(self, kind, message, lines=None, expected=None, actual=None):
+        self.kind = kind
+        self.message = message
+        self.lines = lines
+        self.expected = expected
+        self.actual = actual
+
+    def __str__(self):
+        if self.lines:
+            return f"{self.message} (lines {self.lines[0]}-{self.lines[1]})"
+        return self.message
+
+
 class ValidationResult:
     def __init__(self):
         self.is_valid = True
         self.errors = []
         self.warnings = []
+        self.issues = []
 
-    def add_error(self, msg):
+    def add_error(self, msg, kind="other", **location):
         self.is_valid = False
         self.errors.append(msg)
+        self.issues.append(Issue(kind, msg, **location))
 
     def add_warning(self, msg):
         self.warnings.append(msg)
@@ -30,110 +65,284 @@ def read_file(path: Path) -> str:
     return path.read_text(errors="ignore")
 
 
-# ---------- Extractors ----------
-
+# ---------- Scanner ----------
 
-def extract_headings(text):
-    return [(level, title.strip()) for level, title in HEADING_REGEX.findall(text)]
 
+class Structure:
+    """Structural facts of a markdown document, collected in one pass."""
 
-def extract_code_blocks(text):
-    """Line-based fenced code block extractor.
+    __slots__ = (
+        "headings", "code_blocks", "urls", "paths", "bullets",
+        "heading_lines", "code_block_lines", "url_lines",
+    )
 
-    Handles ``` and ~~~ fences with variable length (CommonMark: closing
-    fence must use same char and be at least as long as opening). Supports
-    nested fences (e.g. an outer 4-backtick block wrapping inner 3-backtick
-    content).
+    def __init__(self):
+        self.headings = []
+        self.code_blocks = []
+        self.urls = set()
+        self.paths = set()
+        self.bullets = 0
+        # 1-based locations, for pointing fixes at the right place
+        self.heading_lines = []
+        self.code_block_lines = []  # (first, last) line of each block
+        self.url_lines = {}  # url -> first line it appears on
+
+
+class StructureScanner:
+    """Incremental line tokenizer producing a :class:`Structure`.
+
+    Fenced code blocks follow CommonMark: ``` and ~~~ fences of variable
+    length, closed by the same char at least as long as the opener (so an
+    outer 4-backtick block can wrap inner 3-backtick content). Lines inside
+    fences are collected verbatim and excluded from heading, URL, path and
+    bullet matching. Unclosed fences are dropped — they indicate malformed
+    markdown and including them would cause false-positive failures.
     """
-    blocks = []
-    lines = text.split("\n")
-    i = 0
-    n = len(lines)
-    while i < n:
-        m = FENCE_OPEN_REGEX.match(lines[i])
-        if not m:
-            i += 1
-            continue
-        fence_char = m.group(2)[0]
-        fence_len = len(m.group(2))
-        open_line = lines[i]
-        block_lines = [open_line]
-        i += 1
-        closed = False
-        while i < n:
-            close_m = FENCE_OPEN_REGEX.match(lines[i])
+
+    def __init__(self):
+        self.structure = Structure()
+        self._fence = None  # (char, length) of the open fence
+        self._block = []
+        self._block_start = 0
+        self._partial = ""
+        self.line_no = 0
+
+    def feed_line(self, line: str):
+        s = self.structure
+        self.line_no += 1
+        m = FENCE_OPEN_REGEX.match(line)
+        if self._fence is not None:
+            self._block.append(line)
             if (
-                close_m
-                and close_m.group(2)[0] == fence_char
-                and len(close_m.group(2)) >= fence_len
-                and close_m.group(3).strip() == ""
+                m
+                and m.group(2)[0] == self._fence[0]
+                and len(m.group(2)) >= self._fence[1]
+                and m.group(3).strip() == ""
             ):
-                block_lines.append(lines[i])
-                closed = True
-                i += 1
-                break
-            block_lines.append(lines[i])
-            i += 1
-        if closed:
-            blocks.append("\n".join(block_lines))
-        # Unclosed fences are silently skipped — they indicate malformed markdown
-        # and including them would cause false-positive validation failures.
-    return blocks
+                s.code_blocks.append("\n".join(self._block))
+                s.code_block_lines.append((self._block_start, self.line_no))
+                self._fence = None
+                self._block = []
+            return
+        if m:
+            self._fence = (m.group(2)[0], len(m.group(2)))
+            self._block = [line]
+            self._block_start = self.line_no
+            return
+        if line.startswith("#"):
+            h = HEADING_REGEX.match(line)
+            if h:
+                s.headings.append((h.group(1), h.group(2).strip()))
+                s.heading_lines.append(self.line_no)
+        if BULLET_REGEX.match(line):
+            s.bullets += 1
+        if "://" in line:
+            for url in URL_REGEX.findall(line):
+                if url not in s.urls:
+                    s.urls.add(url)
+                    s.url_lines[url] = self.line_no
+        if "/" in line or "\\" in line:
+            s.paths.update(PATH_REGEX.findall(line))
+
+    def feed(self, chunk: str):
+        """Feed arbitrary text; complete lines are scanned, the rest is buffered."""
+        lines = (self._partial + chunk).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self.feed_line(line)
+
+    def finish(self) -> Structure:
+        if self._partial:
+            self.feed_line(self._partial)
+            self._partial = ""
+        self._fence = None
+        self._block = []
+        return self.structure
+
+
+def scan(text: str) -> Structure:
+    scanner = StructureScanner()
+    for line in io.StringIO(text):
+        scanner.feed_line(line[:-1] if line.endswith("\n") else line)
+    return scanner.finish()
+
+
+def scan_file(path: Path) -> Structure:
+    """Scan a file line by line without loading it into memory."""
+    scanner = StructureScanner()
+    with open(path, errors="ignore") as f:
+        for line in f:
+            scanner.feed_line(line[:-1] if line.endswith("\n") else line)
+    return scanner.finish()
+
+
+# ---------- Fingerprints ----------
+
+
+class Fingerprint(Structure):
+    """Compact, serializable :class:`Structure` with code blocks reduced to hashes.
+
+    Validators only compare fields for equality, so a fingerprint of the
+    original can be checked against fingerprints of candidate outputs
+    without keeping (or re-reading) the original text.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def from_structure(cls, structure: Structure) -> "Fingerprint":
+        fp = cls()
+        fp.headings = list(structure.headings)
+        fp.code_blocks = [sha256_text(block) for block in structure.code_blocks]
+        fp.urls = set(structure.urls)
+        fp.paths = set(structure.paths)
+        fp.bullets = structure.bullets
+        fp.heading_lines = list(structure.heading_lines)
+        fp.code_block_lines = list(structure.code_block_lines)
+        fp.url_lines = dict(structure.url_lines)
+        return fp
+
+    def to_dict(self) -> dict:
+        return {
+            "headings": [list(h) for h in self.headings],
+            "code_blocks": self.code_blocks,
+            "urls": sorted(self.urls),
+            "paths": sorted(self.paths),
+            "bullets": self.bullets,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Fingerprint":
+        fp = cls()
+        fp.headings = [tuple(h) for h in data["headings"]]
+        fp.code_blocks = list(data["code_blocks"])
+        fp.urls = set(data["urls"])
+        fp.paths = set(data["paths"])
+        fp.bullets = int(data["bullets"])
+        return fp
+
+
+def fingerprint_text(text: str) -> Fingerprint:
+    return Fingerprint.from_structure(scan(text))
+
+
+def _stat_key(path: Path) -> Optional[list]:
+    try:
+        st = path.stat()
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def store_fingerprint(path: Path, fp: Fingerprint):
+    """Save ``fp`` in the sidecar next to ``path``, tagged with its size and mtime."""
+    save_sidecar(path, fingerprint={"stat": _stat_key(path), "data": fp.to_dict()})
+
+
+def load_fingerprint(path: Path, text: Optional[str] = None) -> Fingerprint:
+    """Fingerprint of ``path``, reusing the sidecar copy while the file is unchanged.
+
+    Only ``*.original.md`` backups get their fingerprint persisted; other
+    files are scanned every time so validating arbitrary pairs never leaves
+    files behind. ``text`` is the file's content when the caller already
+    read it.
+    """
+    stored = load_sidecar(path).get("fingerprint")
+    if stored and stored.get("stat") == _stat_key(path):
+        try:
+            return Fingerprint.from_dict(stored["data"])
+        except (KeyError, TypeError, ValueError):
+            pass
+    fp = fingerprint_text(text) if text is not None else Fingerprint.from_structure(scan_file(path))
+    if path.name.endswith(".original.md"):
+        try:
+            store_fingerprint(path, fp)
+        except OSError:
+            pass
+    return fp
+
+
+# ---------- Extractors ----------
+
+
+def extract_headings(text):
+    return scan(text).headings
+
+
+def extract_code_blocks(text):
+    return scan(text).code_blocks
 
 
 def extract_urls(text):
-    return set(URL_REGEX.findall(text))
+    return scan(text).urls
 
 
 def extract_paths(text):
-    return set(PATH_REGEX.findall(text))
+    return scan(text).paths
 
 
 def count_bullets(text):
-    return len(BULLET_REGEX.findall(text))
+    return scan(text).bullets
 
 
 # ---------- Validators ----------
 
 
 def validate_headings(orig, comp, result):
-    h1 = extract_headings(orig)
-    h2 = extract_headings(comp)
+    h1 = orig.headings
+    h2 = comp.headings
 
     if len(h1) != len(h2):
-        result.add_error(f"Heading count mismatch: {len(h1)} vs {len(h2)}")
+        result.add_error(
+            f"Heading count mismatch: {len(h1)} vs {len(h2)}",
+            kind="headings", expected=h1, actual=h2,
+        )
 
     if h1 != h2:
         result.add_warning("Heading text/order changed")
 
 
 def validate_code_blocks(orig, comp, result):
-    c1 = extract_code_blocks(orig)
-    c2 = extract_code_blocks(comp)
+    c1 = orig.code_blocks
+    c2 = comp.code_blocks
 
     if c1 != c2:
-        result.add_error("Code blocks not preserved exactly")
+        # Point at the first block that differs
+        i = next((i for i, (a, b) in enumerate(zip(c1, c2)) if a != b), min(len(c1), len(c2)))
+        lines = comp.code_block_lines[i] if i < len(comp.code_block_lines) else None
+        result.add_error(
+            "Code blocks not preserved exactly",
+            kind="code_block", lines=lines,
+            expected=c1[i] if i < len(c1) else None,
+            actual=c2[i] if i < len(c2) else None,
+        )
 
 
 def validate_urls(orig, comp, result):
-    u1 = extract_urls(orig)
-    u2 = extract_urls(comp)
+    u1 = orig.urls
+    u2 = comp.urls
 
     if u1 != u2:
-        result.add_error(f"URL mismatch: lost={u1 - u2}, added={u2 - u1}")
+        added = u2 - u1
+        added_lines = sorted(comp.url_lines[u] for u in added if u in comp.url_lines)
+        result.add_error(
+            f"URL mismatch: lost={u1 - u2}, added={added}",
+            kind="url", lines=(added_lines[0], added_lines[-1]) if added_lines else None,
+            expected=sorted(u1 - u2), actual=sorted(added),
+        )
 
 
 def validate_paths(orig, comp, result):
-    p1 = extract_paths(orig)
-    p2 = extract_paths(comp)
+    p1 = orig.paths
+    p2 = comp.paths
 
     if p1 != p2:
         result.add_warning(f"Path mismatch: lost={p1 - p2}, added={p2 - p1}")
 
 
 def validate_bullets(orig, comp, result):
-    b1 = count_bullets(orig)
-    b2 = count_bullets(comp)
+    b1 = orig.bullets
+    b2 = comp.bullets
 
     if b1 == 0:
         return
@@ -147,26 +356,131 @@ def validate_bullets(orig, comp, result):
 # ---------- Main ----------
 
 
-def validate(original_path: Path, compressed_path: Path) -> ValidationResult:
+VALIDATORS = (
+    ("headings", validate_headings),
+    ("code_blocks", validate_code_blocks),
+    ("urls", validate_urls),
+    ("paths", validate_paths),
+    ("bullets", validate_bullets),
+)
+
+
+def validate_structures(orig: Structure, comp: Structure) -> ValidationResult:
     result = ValidationResult()
 
-    orig = read_file(original_path)
-    comp = read_file(compressed_path)
+    for name, validator in VALIDATORS:
+        with span(f"validate.{name}"):
+            validator(orig, comp, result)
+
+    return result
+
+
+def check(original: Fingerprint, candidate: str) -> ValidationResult:
+    """Validate in-memory ``candidate`` text against a precomputed fingerprint."""
+    with span("validate") as s:
+        with span("validate.scan"):
+            candidate_fp = fingerprint_text(candidate)
+        result = validate_structures(original, candidate_fp)
+        s.set(errors=len(result.errors))
+    return result
 
-    validate_headings(orig, comp, result)
-    validate_code_blocks(orig, comp, result)
-    validate_urls(orig, comp, result)
-    validate_paths(orig, comp, result)
-    validate_bullets(orig, comp, result)
 
+def validate(original_path: Path, compressed_path: Path) -> ValidationResult:
+    # The retention check needs both texts, so each file is read once and
+    # the same text is scanned for structure
+    original = read_file(original_path)
+    compressed = read_file(compressed_path)
+    result = validate_structures(load_fingerprint(original_path, original), fingerprint_text(compressed))
+    # Imported here: retention builds on sections, which imports this module
+    try:
+        from .retention import add_retention_warnings
+    except ImportError:
+        from retention import add_retention_warnings
+    with span("validate.retention"):
+        add_retention_warnings(result, original, compressed)
     return result
 
 
+# ---------- Streaming ----------
+
+
+# Info strings of an outer fence a model may wrap its whole answer in.
+WRAPPER_INFO = ("markdown", "md")
+
+
+class Diverged(Exception):
+    """Raised by :class:`StreamCheck` once streamed output can no longer validate."""
+
+
+class StreamCheck:
+    """Checks model output against the original's structure as it streams in.
+
+    Only divergence that local repair cannot undo stops a stream: a
+    heading added, dropped or skipped (the heading count then never
+    matches and sections no longer line up), or output running past the
+    original's length. Altered code blocks and URLs are left to
+    :func:`repair.repair`, which restores them from the original for free.
+    """
+
+    def __init__(self, original: Fingerprint, leading_heading: bool = False, max_chars: Optional[int] = None):
+        self.expected = original.headings
+        self.has_code = bool(original.code_blocks)
+        self.leading_heading = leading_heading
+        self.max_chars = max_chars
+        self.scanner = StructureScanner()
+        self.chars = 0
+        self._started = False
+        self._partial = ""
+
+    def feed(self, chunk: str):
+        """Feed streamed text; raises :class:`Diverged` as soon as it goes wrong."""
+        self.chars += len(chunk)
+        if self.max_chars is not None and self.chars > self.max_chars:
+            raise Diverged(f"output ran past {self.max_chars} characters, longer than the original")
+        lines = (self._partial + chunk).split("\n")
+        self._partial = lines.pop()
+        for line in lines:
+            self._feed_line(line)
+
+    def _feed_line(self, line: str):
+        if not self._started:
+            if not line.strip():
+                return
+            self._started = True
+            m = FENCE_OPEN_REGEX.match(line)
+            info = m.group(3).strip().lower() if m else None
+            if info in WRAPPER_INFO or (info == "" and not self.has_code):
+                return  # outer wrapper fence, stripped from the final answer
+            if self.leading_heading and not HEADING_REGEX.match(line):
+                raise Diverged(f"heading dropped: expected {self._heading(0)}")
+        headings = self.scanner.structure.headings
+        count = len(headings)
+        self.scanner.feed_line(line)
+        if len(headings) == count:
+            return
+        got = headings[-1]
+        if count >= len(self.expected):
+            raise Diverged(f"heading added: {got[0]} {got[1]}")
+        if got != self.expected[count] and got in self.expected[count + 1:]:
+            raise Diverged(f"heading skipped: expected {self._heading(count)}")
+
+    def _heading(self, i: int) -> str:
+        return " ".join(self.expected[i]) if i < len(self.expected) else "no heading"
+
+
+def stream_check(original: str) -> StreamCheck:
+    """A :class:`StreamCheck` for output that should mirror ``original``."""
+    first = next((line for line in original.split("\n") if line.strip()), "")
+    return StreamCheck(
+        fingerprint_text(original),
+        leading_heading=bool(HEADING_REGEX.match(first)),
+        max_chars=int(len(original) * 1.2) + 200,
+    )
+
+
 # ---------- CLI ----------
 
 if __name__ == "__main__":
-    import sys
-
     if len(sys.argv) != 3:
         print("Usage: python validate.py <original> <compressed>")
         sys.exit(1)
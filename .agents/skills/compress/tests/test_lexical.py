@@ -0,0 +1,42 @@
+"""Fixtures for the local lexical pass: each source line and its expected rewrite."""
+
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from scripts.lexical import compress_text  # noqa: E402
+
+CASES = [
+    # Filler inside hyphenated words is part of the word
+    ("Use just-in-time and simply-typed code.", "Use just-in-time and simply-typed code."),
+    # A deleted sentence-leading word leaves the next one capitalized
+    ("Does it work? Actually, no.", "Does it work? No."),
+    (
+        "Run it before you push. Actually, reading https://example.com/a helps.",
+        "Run it before you push. Reading https://example.com/a helps.",
+    ),
+    ("Done. The cache is warm. However, it is slow.", "Done. Cache is warm. It is slow."),
+    # No comma stranded before the end of the sentence
+    ("Don't just delete it, really.", "Don't delete it."),
+    ("Don't just delete it, really", "Don't delete it"),
+    # "make sure to" is dropped; "make sure (that)" keeps its meaning
+    ("Make sure to run the tests.", "Run tests."),
+    ("Make sure that it works.", "Ensure it works."),
+    ("make sure the tests pass", "ensure tests pass"),
+    # "you should" only at a sentence start, and never before "not"
+    ("If you should need help, ask.", "If you should need help, ask."),
+    ("You should run lint. You should not push.", "Run lint. You should not push."),
+    # Mid-sentence connectives carry meaning
+    ("So, however, it fails.", "So, however, it fails."),
+    # Labels and identifiers stay intact
+    ("Choose A or B.", "Choose A or B."),
+    ("Copy commit.env to `./x`.", "Copy commit.env to `./x`."),
+]
+
+
+@pytest.mark.parametrize("source,expected", CASES)
+def test_compress_text(source, expected):
+    assert compress_text(source) == expected